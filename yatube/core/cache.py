@@ -0,0 +1,173 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'yatube-l1',
+            'OPTIONS': {'SHARED': 'shared'},
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/var/tmp/yatube_cache',
+        },
+    }
+
+Чтение сначала идёт в локальный LRU, промах — в общий кэш.
+Удаление и incr/decr меняют в общем кэше штамп группы ключей —
+части ключа до первого двоеточия (feed_version, follow_graph и т. п.),
+clear меняет общий штамп. Остальные процессы сверяют штампы не чаще
+STAMP_CHECK_INTERVAL секунд и при расхождении перестают отдавать
+из LRU ключи этой группы; записи других групп остаются. Перезапись
+ключа через set штамп не меняет: в чужих процессах старое значение
+живёт не дольше LOCAL_TIMEOUT секунд. incr атомарен, только если
+атомарен incr общего кэша; у FileBasedCache это get и set.
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STAMP_KEY = 'tiered_cache:stamp'
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class _LocalStore:
+    """LRU процесса, общий для всех потоков."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Ключ штампа -> (штамп, когда сверен)
+        self.stamps = {}
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options['SHARED']
+        self._max_local = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._stamp_interval = float(options.get('STAMP_CHECK_INTERVAL', 1))
+        with _stores_lock:
+            self._store = _stores.setdefault(location, _LocalStore())
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    @staticmethod
+    def _stamp_keys(key):
+        return STAMP_KEY, f'{STAMP_KEY}:{key.split(":", 1)[0]}'
+
+    def _stamps(self, key):
+        """Текущие общий штамп и штамп группы key, сверенные по интервалу."""
+        store = self._store
+        now = time.monotonic()
+        stamps = []
+        for stamp_key in self._stamp_keys(key):
+            with store.lock:
+                stamp, checked_at = store.stamps.get(stamp_key, (None, None))
+            if checked_at is None or now - checked_at >= self._stamp_interval:
+                stamp = self.shared.get(stamp_key)
+                with store.lock:
+                    store.stamps[stamp_key] = (stamp, now)
+            stamps.append(stamp)
+        return tuple(stamps)
+
+    def _bump_stamp(self, stamp_key):
+        stamp = uuid.uuid4().hex
+        self.shared.set(stamp_key, stamp, None)
+        with self._store.lock:
+            self._store.stamps[stamp_key] = (stamp, time.monotonic())
+
+    def _local_get(self, key, stamps):
+        store = self._store
+        with store.lock:
+            entry = store.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic() or entry[2] != stamps:
+                del store.entries[key]
+                return None
+            store.entries.move_to_end(key)
+            return entry
+
+    def _local_set(self, key, value, stamps, timeout=DEFAULT_TIMEOUT):
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None \
+                and timeout <= 0:
+            return self._local_delete(key)
+        lifetime = self._local_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            lifetime = min(lifetime, timeout)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        store = self._store
+        with store.lock:
+            store.entries[key] = (
+                pickled, time.monotonic() + lifetime, stamps)
+            store.entries.move_to_end(key)
+            while len(store.entries) > self._max_local:
+                store.entries.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._store.lock:
+            self._store.entries.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version=version)
+        stamps = self._stamps(key)
+        entry = self._local_get(local_key, stamps)
+        if entry is not None:
+            return pickle.loads(entry[0])
+        missing = object()
+        value = self.shared.get(key, missing, version=version)
+        if value is missing:
+            return default
+        self._local_set(local_key, value, stamps)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(
+            self.make_key(key, version=version), value, self._stamps(key),
+            timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(
+                self.make_key(key, version=version), value,
+                self._stamps(key), timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self._local_delete(self.make_key(key, version=version))
+        self._bump_stamp(self._stamp_keys(key)[1])
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._bump_stamp(self._stamp_keys(key)[1])
+        self._local_set(
+            self.make_key(key, version=version), value, self._stamps(key))
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def clear(self):
+        self.shared.clear()
+        with self._store.lock:
+            self._store.entries.clear()
+        self._bump_stamp(STAMP_KEY)
@@ -0,0 +1,93 @@
+"""SQLite для нагрузки с конкурентной записью.
+
+На каждое новое соединение ставятся прагмы из DEFAULT_PRAGMAS (WAL,
+synchronous=NORMAL, mmap, кэш страниц), их можно переопределить
+в OPTIONS['pragmas']. Таймаут ожидания блокировки — OPTIONS['timeout']
+в секундах, как у sqlite3.connect.
+
+Транзакции открываются через BEGIN IMMEDIATE: блокировка записи
+берётся сразу, и ожидание идёт в busy-обработчике SQLite. С обычным
+BEGIN читающая транзакция, решившая писать, получает «database is
+locked» без ожидания. Внутри процесса пишущие транзакции к одной
+базе выстраиваются в очередь на threading.Lock, а не опрашивают файл
+блокировки.
+"""
+import threading
+
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — в килобайтах
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+DEFAULT_TIMEOUT = 20
+
+_write_locks = {}
+_write_locks_lock = threading.Lock()
+
+
+def write_lock(name):
+    with _write_locks_lock:
+        return _write_locks.setdefault(name, threading.Lock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    held_write_lock = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **params.pop('pragmas', {})}
+        self.transaction_mode = params.pop('transaction_mode', 'IMMEDIATE')
+        self.serialize_writes = params.pop('serialize_writes', True)
+        params.setdefault('timeout', DEFAULT_TIMEOUT)
+        self.timeout = params['timeout']
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        lock = None
+        if self.serialize_writes and not self.is_in_memory_db():
+            lock = write_lock(self.settings_dict['NAME'])
+            # Не дождались — идём дальше, ждать будет уже SQLite
+            if not lock.acquire(timeout=self.timeout):
+                lock = None
+        try:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        except BaseException:
+            if lock is not None:
+                lock.release()
+            raise
+        self.held_write_lock = lock
+
+    def release_write_lock(self):
+        if self.held_write_lock is not None:
+            self.held_write_lock.release()
+            self.held_write_lock = None
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
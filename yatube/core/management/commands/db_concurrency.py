@@ -0,0 +1,171 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from posts.management.commands.benchmark import percentile
+
+MODES = {
+    # Как было: журнал отката, BEGIN DEFERRED, соединение на запрос
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {},
+    },
+    'tuned': {
+        'ENGINE': 'core.db_backends.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'timeout': 20},
+    },
+}
+
+SCHEMA = (
+    'CREATE TABLE bench_post (id INTEGER PRIMARY KEY, author INTEGER, '
+    'text TEXT)',
+    'CREATE TABLE bench_stats (author INTEGER PRIMARY KEY, posts INTEGER)',
+    'CREATE INDEX bench_post_author ON bench_post (author)',
+)
+
+AUTHORS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет пропускную способность SQLite при параллельных чтении '
+        'и записи для исходных и настроенных параметров базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument(
+            '--writers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--seconds', type=float, default=3.0,
+                            help='Длительность одного прогона.')
+        parser.add_argument(
+            '--modes', nargs='+', choices=tuple(MODES),
+            default=list(MODES))
+        parser.add_argument('--output', help='Куда записать JSON.')
+
+    def handle(self, *args, **options):
+        results = []
+        self.stdout.write(
+            f'{"режим":8} {"писат.":>6} {"чтений/с":>10} {"записей/с":>10} '
+            f'{"p95 записи":>11} {"ошибки":>7}')
+        for mode in options['modes']:
+            for writers in options['writers']:
+                result = self.run(
+                    mode, options['readers'], writers, options['seconds'])
+                results.append(result)
+                self.stdout.write(
+                    f'{mode:8} {writers:6d} '
+                    f'{result["reads_per_second"]:10.0f} '
+                    f'{result["writes_per_second"]:10.0f} '
+                    f'{result["write_p95_ms"]:8.1f} мс '
+                    f'{result["errors"]:7d}')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def run(self, mode, readers, writers, seconds):
+        with tempfile.TemporaryDirectory() as directory:
+            alias = f'concurrency_{mode}_{writers}'
+            connections.databases[alias] = {
+                **MODES[mode], 'NAME': os.path.join(directory, 'bench.db')}
+            try:
+                self.prepare(alias)
+                return self.measure(alias, mode, readers, writers, seconds)
+            finally:
+                connections[alias].close()
+                del connections[alias]
+                del connections.databases[alias]
+
+    def prepare(self, alias):
+        with connections[alias].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            cursor.executemany(
+                'INSERT INTO bench_stats VALUES (%s, 0)',
+                [(author,) for author in range(AUTHORS)])
+
+    def measure(self, alias, mode, readers, writers, seconds):
+        deadline = time.perf_counter() + seconds
+        stats = {'reads': 0, 'writes': 0, 'errors': 0, 'latencies': []}
+        lock = threading.Lock()
+
+        def worker(operation):
+            reads = writes = errors = 0
+            latencies = []
+            number = 0
+            while time.perf_counter() < deadline:
+                number += 1
+                started = time.perf_counter()
+                try:
+                    operation(alias, number)
+                except OperationalError:
+                    errors += 1
+                else:
+                    if operation is self.read:
+                        reads += 1
+                    else:
+                        writes += 1
+                        latencies.append(time.perf_counter() - started)
+                # Конец «запроса»: при CONN_MAX_AGE = 0 соединение
+                # закрывается, как после ответа
+                connections[alias].close_if_unusable_or_obsolete()
+            connections[alias].close()
+            with lock:
+                stats['reads'] += reads
+                stats['writes'] += writes
+                stats['errors'] += errors
+                stats['latencies'] += latencies
+
+        threads = [
+            threading.Thread(target=worker, args=(self.read,))
+            for _ in range(readers)
+        ] + [
+            threading.Thread(target=worker, args=(self.write,))
+            for _ in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        latencies = stats['latencies'] or [0]
+        return {
+            'mode': mode,
+            'readers': readers,
+            'writers': writers,
+            'reads_per_second': stats['reads'] / seconds,
+            'writes_per_second': stats['writes'] / seconds,
+            'write_p95_ms': percentile(latencies, 95) * 1000,
+            'errors': stats['errors'],
+        }
+
+    @staticmethod
+    def read(alias, number):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                'SELECT id, author, text FROM bench_post '
+                'ORDER BY id DESC LIMIT 10')
+            cursor.fetchall()
+
+    @staticmethod
+    def write(alias, number):
+        """Как create_post: чтение счётчика, вставка и его обновление."""
+        author = number % AUTHORS
+        with transaction.atomic(using=alias):
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    'SELECT posts FROM bench_stats WHERE author = %s',
+                    [author])
+                cursor.fetchone()
+                cursor.execute(
+                    'INSERT INTO bench_post (author, text) VALUES (%s, %s)',
+                    [author, 'Текст поста ' * 10])
+                cursor.execute(
+                    'UPDATE bench_stats SET posts = posts + 1 '
+                    'WHERE author = %s', [author])
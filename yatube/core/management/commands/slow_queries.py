@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core import slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Показывает запросы к базе с наибольшим суммарным временем.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--order',
+            choices=('total', 'max', 'count'),
+            default='total',
+            help='Сортировка: суммарное время, максимум или число.',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Очистить накопленную статистику после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        slow_queries.flush(force=True)
+        rows = slow_queries.top(options['limit'], options['order'])
+        if not rows:
+            self.stdout.write('Статистика запросов пуста')
+        for sql, count, total, longest in rows:
+            self.stdout.write(
+                f'{total * 1000:10.1f} мс всего  {count:8d} раз  '
+                f'макс. {longest * 1000:.1f} мс  '
+                f'сред. {total / count * 1000:.2f} мс'
+            )
+            self.stdout.write(f'    {sql}')
+        if options['reset']:
+            slow_queries.reset()
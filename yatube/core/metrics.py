@@ -0,0 +1,232 @@
+"""Метрики производительности запросов.
+
+MetricsMiddleware открывает на время запроса замер (Sample) в
+thread-local, а обёртки ниже дописывают в него SQL, рендеринг
+шаблонов и обращения к кэшу. Вне замера обёртки стоят одну проверку
+атрибута thread-local. Рендеринг дополнительно разбивается по именам
+шаблонов: время каждого шаблона включает вложенные в него include.
+
+Метрики хранятся в памяти процесса: монотонные суммы по имени view
+и кольцевой буфер последних замеров для квантилей длительности.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.base import Template
+
+TOTAL_FIELDS = (
+    'requests',
+    'seconds',
+    'sql_queries',
+    'sql_seconds',
+    'template_seconds',
+    'cache_hits',
+    'cache_misses',
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_local = threading.local()
+_lock = threading.Lock()
+_totals = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, 0))
+_recent = {}
+_templates = defaultdict(lambda: [0, 0.0])
+_installed = False
+
+
+class Sample:
+    __slots__ = (
+        'sql_queries', 'sql_seconds', 'template_seconds',
+        'cache_hits', 'cache_misses', 'template_depth', 'cache_depth',
+        'templates',
+    )
+
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Вложенные шаблоны и кэши (TieredCache -> shared) не считаем
+        # дважды
+        self.template_depth = 0
+        self.cache_depth = 0
+        # имя шаблона -> [рендеров, секунд]
+        self.templates = {}
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_queries += 1
+            self.sql_seconds += time.perf_counter() - started
+
+
+def current():
+    return getattr(_local, 'sample', None)
+
+
+def start():
+    _local.sample = Sample()
+    return _local.sample
+
+
+def finish(view_name, sample, seconds):
+    """Сохраняет завершённый замер запроса к view_name."""
+    _local.sample = None
+    with _lock:
+        totals = _totals[view_name]
+        totals['requests'] += 1
+        totals['seconds'] += seconds
+        for field in TOTAL_FIELDS[2:]:
+            totals[field] += getattr(sample, field)
+        recent = _recent.get(view_name)
+        if recent is None:
+            recent = _recent[view_name] = deque(
+                maxlen=settings.METRICS_BUFFER_SIZE)
+        recent.append(seconds)
+        for name, (renders, template_seconds) in sample.templates.items():
+            totals = _templates[name]
+            totals[0] += renders
+            totals[1] += template_seconds
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+        _recent.clear()
+        _templates.clear()
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        sample = current()
+        if sample is None:
+            return render(self, context)
+        sample.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            sample.template_depth -= 1
+            if not sample.template_depth:
+                sample.template_seconds += elapsed
+            stats = sample.templates.setdefault(
+                self.name or '<string>', [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+    wrapper.metrics_original = render
+    return wrapper
+
+
+def _counted_get(get):
+    missing = object()
+
+    def wrapper(self, key, default=None, version=None):
+        sample = current()
+        if sample is None or sample.cache_depth:
+            return get(self, key, default, version)
+        sample.cache_depth += 1
+        try:
+            value = get(self, key, missing, version)
+        finally:
+            sample.cache_depth -= 1
+        if value is missing:
+            sample.cache_misses += 1
+            return default
+        sample.cache_hits += 1
+        return value
+    wrapper.metrics_original = get
+    return wrapper
+
+
+def install():
+    """Подключает обёртки шаблонов и кэшей (один раз)."""
+    global _installed
+    with _lock:
+        if _installed:
+            return
+        Template.render = _timed_render(Template.render)
+        for backend_class in {type(caches[alias]) for alias in
+                              settings.CACHES}:
+            if not hasattr(backend_class.get, 'metrics_original'):
+                backend_class.get = _counted_get(backend_class.get)
+        _installed = True
+
+
+def quantile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+def _labels(view_name, **extra):
+    return _format_labels([('view', view_name)] + list(extra.items()))
+
+
+def _format_labels(pairs):
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render_prometheus():
+    """Метрики в текстовом формате Prometheus."""
+    with _lock:
+        totals = {view: dict(values) for view, values in _totals.items()}
+        recent = {view: list(values) for view, values in _recent.items()}
+        templates = {name: tuple(stats) for name, stats in _templates.items()}
+    lines = [
+        '# HELP yatube_metrics_sample_rate Доля запросов под замером.',
+        '# TYPE yatube_metrics_sample_rate gauge',
+        f'yatube_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}',
+        '# HELP yatube_request_seconds Длительность запросов к view.',
+        '# TYPE yatube_request_seconds summary',
+    ]
+    for view, values in sorted(totals.items()):
+        for fraction in QUANTILES:
+            if recent.get(view):
+                lines.append(
+                    f'yatube_request_seconds'
+                    f'{_labels(view, quantile=fraction)} '
+                    f'{quantile(recent[view], fraction):.6f}'
+                )
+        lines.append(
+            f'yatube_request_seconds_sum{_labels(view)} '
+            f'{values["seconds"]:.6f}')
+        lines.append(
+            f'yatube_request_seconds_count{_labels(view)} '
+            f'{values["requests"]}')
+    for field in TOTAL_FIELDS[2:]:
+        metric = f'yatube_{field}_total'
+        lines.append(f'# TYPE {metric} counter')
+        for view, values in sorted(totals.items()):
+            value = values[field]
+            if isinstance(value, float):
+                value = f'{value:.6f}'
+            lines.append(f'{metric}{_labels(view)} {value}')
+    lines += [
+        '# HELP yatube_template_renders_total Рендеры шаблона.',
+        '# TYPE yatube_template_renders_total counter',
+    ]
+    for name, (renders, seconds) in sorted(templates.items()):
+        lines.append(
+            f'yatube_template_renders_total'
+            f'{_format_labels([("template", name)])} {renders}')
+    lines += [
+        '# HELP yatube_template_render_seconds_total Время рендеринга '
+        'шаблона вместе с вложенными.',
+        '# TYPE yatube_template_render_seconds_total counter',
+    ]
+    for name, (renders, seconds) in sorted(templates.items()):
+        lines.append(
+            f'yatube_template_render_seconds_total'
+            f'{_format_labels([("template", name)])} {seconds:.6f}')
+    return '\n'.join(lines) + '\n'
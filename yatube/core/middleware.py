@@ -0,0 +1,78 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, replicas, slow_queries
+
+
+class MetricsMiddleware:
+    """Замеряет время, SQL, шаблоны и кэш каждого запроса к view.
+
+    Под замер попадает доля METRICS_SAMPLE_RATE запросов, остальные
+    проходят без обёрток.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install()
+
+    def __call__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        sample = metrics.start()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(sample.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            match = request.resolver_match
+            metrics.finish(
+                match.view_name if match else 'unresolved',
+                sample,
+                time.perf_counter() - started,
+            )
+        return response
+
+
+class SlowQueryMiddleware:
+    """Передаёт журналу медленных запросов путь текущего запроса
+    и периодически сбрасывает счётчики в кэш."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_queries.set_path(request.path)
+        try:
+            return self.get_response(request)
+        finally:
+            slow_queries.set_path(None)
+            slow_queries.flush()
+
+
+class PrimaryPinMiddleware:
+    """После запроса с записью в базу ставит cookie, и чтение
+    пользователя REPLICA_PIN_SECONDS секунд идёт с default."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with replicas.tracking_writes():
+            response = self.get_response(request)
+            wrote = replicas.wrote()
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                replicas.PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,79 @@
+"""Чтение с реплик базы.
+
+View, помеченные replica_reads, читают с одной из баз
+DATABASE_REPLICAS, остальные запросы и все записи идут в default.
+Чтобы пользователь сразу видел свои посты и комментарии, после
+запроса с записью PrimaryPinMiddleware ставит cookie, и ещё
+REPLICA_PIN_SECONDS секунд его запросы читают с default.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+
+_local = threading.local()
+
+
+@contextmanager
+def reading_from_replica():
+    previous = getattr(_local, 'replica', False)
+    _local.replica = True
+    try:
+        yield
+    finally:
+        _local.replica = previous
+
+
+@contextmanager
+def tracking_writes():
+    """Отмечает в _local.wrote, была ли запись к базе."""
+    _local.wrote = False
+    try:
+        yield
+    finally:
+        _local.wrote = None
+
+
+def wrote():
+    return bool(getattr(_local, 'wrote', False))
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def replica_reads(view):
+    """Безопасные запросы к view читают с реплики, если нет привязки."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in ('GET', 'HEAD')
+                or is_pinned(request)):
+            return view(request, *args, **kwargs)
+        with reading_from_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (not getattr(_local, 'replica', False)
+                or not settings.DATABASE_REPLICAS
+                # В транзакции читаем то, что в ней же записали
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        if getattr(_local, 'wrote', None) is False:
+            _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что в default
+        return True
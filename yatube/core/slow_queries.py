@@ -0,0 +1,136 @@
+"""Журнал медленных запросов.
+
+Обёртка execute_wrapper подключается к каждому соединению с базой и
+считает для каждого отпечатка SQL (литералы и списки IN заменены на ?)
+число выполнений, суммарное и максимальное время. Запросы дольше
+SLOW_QUERY_THRESHOLD_MS пишутся в лог вместе с путём запроса и стеком
+вызова из кода проекта.
+
+Счётчики копятся в памяти процесса и не реже SLOW_QUERY_FLUSH_INTERVAL
+секунд сливаются в общий кэш, откуда их читает команда slow_queries.
+Слияние не атомарно: при одновременном сбросе из нескольких процессов
+часть приращений может потеряться, для поиска худших запросов этого
+достаточно.
+"""
+import logging
+import re
+import threading
+import time
+import traceback
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'slow_queries:stats'
+
+_local = threading.local()
+_lock = threading.Lock()
+_pending = {}
+_flushed_at = time.monotonic()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_VALUES = re.compile(r'(\(\.\.\.\)(?:\s*,\s*)?)+')
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """SQL без литералов: одинаковые по форме запросы совпадают."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    sql = _VALUES.sub('(...) ', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def set_path(path):
+    _local.path = path
+
+
+def project_stack():
+    """Кадры стека из кода проекта, без Django и библиотек."""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('slow_queries.py')
+    ]
+    return ''.join(traceback.format_list(frames))
+
+
+def record(execute, sql, params, many, context):
+    """execute_wrapper: замеряет запрос и копит счётчики отпечатка."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        key = fingerprint(sql)
+        with _lock:
+            stats = _pending.get(key)
+            if stats is None:
+                stats = _pending[key] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+        if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            logger.warning(
+                'Медленный запрос %.1f мс на %s: %s\n%s',
+                elapsed * 1000,
+                getattr(_local, 'path', '-'),
+                sql,
+                project_stack(),
+            )
+
+
+def install(connection, **kwargs):
+    """Приёмник connection_created: подключает record к соединению."""
+    if record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record)
+
+
+def flush(force=False):
+    """Сливает накопленные счётчики в кэш."""
+    global _flushed_at
+    now = time.monotonic()
+    interval = settings.SLOW_QUERY_FLUSH_INTERVAL
+    with _lock:
+        if not force and now - _flushed_at < interval:
+            return
+        pending = dict(_pending)
+        _pending.clear()
+        _flushed_at = now
+    if not pending:
+        return
+    stats = cache.get(CACHE_KEY) or {}
+    for key, (count, total, longest) in pending.items():
+        old_count, old_total, old_longest = stats.get(key, (0, 0.0, 0.0))
+        stats[key] = (
+            old_count + count, old_total + total, max(old_longest, longest))
+    cache.set(CACHE_KEY, stats, None)
+
+
+def top(limit=20, order='total'):
+    """Худшие отпечатки: (sql, число, сумма, максимум) по убыванию."""
+    column = {'count': 1, 'total': 2, 'max': 3}[order]
+    rows = [
+        (sql, count, total, longest)
+        for sql, (count, total, longest) in
+        (cache.get(CACHE_KEY) or {}).items()
+    ]
+    rows.sort(key=lambda row: row[column], reverse=True)
+    return rows[:limit]
+
+
+def reset():
+    with _lock:
+        _pending.clear()
+    cache.delete(CACHE_KEY)
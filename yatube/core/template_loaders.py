@@ -0,0 +1,57 @@
+"""Загрузчик шаблонов, встраивающий постоянные include.
+
+{% include 'имя' %} без with и only заменяется текстом подключаемого
+шаблона ещё до компиляции. В циклах по постам это убирает на каждой
+итерации поиск шаблона и отдельный слой контекста. Шаблоны с extends
+или block не встраиваются, для них include остаётся как есть.
+
+Включается в production-настройках под cached.Loader, поэтому номера
+строк в ошибках указывают на шаблон после встраивания.
+"""
+import re
+
+from django.template import Origin, TemplateDoesNotExist
+from django.template.loaders.base import Loader as BaseLoader
+
+INCLUDE = re.compile(r"""{%\s*include\s+(['"])([^'"]+)\1\s*%}""")
+NOT_INLINABLE = re.compile(r'{%\s*(?:extends|block)\b')
+MAX_DEPTH = 5
+
+
+class Loader(BaseLoader):
+    """Обёртка над загрузчиками: берёт их исходник и встраивает include."""
+
+    def __init__(self, engine, loaders):
+        self.loaders = engine.get_template_loaders(loaders)
+        super().__init__(engine)
+
+    def get_template_sources(self, template_name):
+        # cached.Loader читает исходник через origin.loader, поэтому
+        # источники дочерних загрузчиков оборачиваются в свои
+        for loader in self.loaders:
+            for source in loader.get_template_sources(template_name):
+                origin = Origin(source.name, source.template_name, self)
+                origin.source = source
+                yield origin
+
+    def get_contents(self, origin):
+        return self.inline(origin.source.loader.get_contents(origin.source))
+
+    def inline(self, source, depth=0):
+        if depth >= MAX_DEPTH:
+            return source
+
+        def replace(match):
+            included = self.find_source(match.group(2))
+            if included is None or NOT_INLINABLE.search(included):
+                return match.group(0)
+            return self.inline(included, depth + 1)
+        return INCLUDE.sub(replace, source)
+
+    def find_source(self, template_name):
+        for origin in self.get_template_sources(template_name):
+            try:
+                return origin.source.loader.get_contents(origin.source)
+            except TemplateDoesNotExist:
+                continue
+        return None
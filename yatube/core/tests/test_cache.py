@@ -0,0 +1,89 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import TieredCache, _stores
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-shared',
+    },
+}
+
+
+def make_worker(name, stamp_interval=0):
+    return TieredCache(name, {'OPTIONS': {
+        'SHARED': 'shared',
+        'LOCAL_MAX_ENTRIES': 2,
+        'STAMP_CHECK_INTERVAL': stamp_interval,
+    }})
+
+
+@override_settings(CACHES=CACHES)
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        _stores.clear()
+        self.first = make_worker('worker-1')
+        self.second = make_worker('worker-2')
+
+    def test_local_hit_skips_shared_store(self):
+        """Повторное чтение обслуживается из памяти процесса"""
+        self.first.set('key', 'value')
+        caches['shared'].set('key', 'changed')
+        self.assertEqual(self.first.get('key'), 'value')
+
+    def test_miss_reads_shared_store(self):
+        """Промах L1 читает значение, записанное другим процессом"""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+
+    def test_delete_invalidates_other_workers(self):
+        """Удаление сбрасывает L1 других процессов по штампу"""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_incr_is_visible_everywhere(self):
+        """Счётчики версий согласованы между процессами"""
+        self.first.set('version', 1)
+        self.assertEqual(self.second.get('version'), 1)
+        self.assertEqual(self.first.incr('version'), 2)
+        self.assertEqual(self.second.get('version'), 2)
+
+    def test_stamp_checked_by_interval(self):
+        """Штамп сверяется не чаще заданного интервала"""
+        lazy = make_worker('worker-lazy', stamp_interval=60)
+        self.first.set('key', 'value')
+        self.assertEqual(lazy.get('key'), 'value')
+        self.first.delete('key')
+        self.assertEqual(lazy.get('key'), 'value')
+
+    def test_lru_bounded(self):
+        """Локальный уровень ограничен LOCAL_MAX_ENTRIES"""
+        for key in ('a', 'b', 'c'):
+            self.first.set(key, key)
+        caches['shared'].delete('a')
+        self.assertIsNone(self.first.get('a'))
+        self.assertEqual(self.first.get('c'), 'c')
+
+    def test_delete_keeps_other_prefixes(self):
+        """Удаление сбрасывает в L1 только ключи своего префикса"""
+        self.first.set('a:key', 'value')
+        self.first.set('b:key', 'value')
+        self.assertEqual(self.second.get('b:key'), 'value')
+        caches['shared'].set('b:key', 'changed')
+        self.first.delete('a:key')
+        self.assertIsNone(self.second.get('a:key'))
+        self.assertEqual(self.second.get('b:key'), 'value')
+
+    def test_clear_invalidates_all_prefixes(self):
+        """clear сбрасывает L1 других процессов целиком"""
+        self.first.set('a:key', 'value')
+        self.assertEqual(self.second.get('a:key'), 'value')
+        self.first.clear()
+        self.assertIsNone(self.second.get('a:key'))
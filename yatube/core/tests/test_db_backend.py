@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import SimpleTestCase
+
+from core.db_backends.sqlite3.base import write_lock
+
+ALIAS = 'tuned_sqlite'
+
+
+class TunedSQLiteTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'test.db')
+        connections.databases[ALIAS] = {
+            'ENGINE': 'core.db_backends.sqlite3', 'NAME': self.path}
+        self.addCleanup(connections.databases.pop, ALIAS)
+        self.connection = connections[ALIAS]
+        self.addCleanup(connections.__delitem__, ALIAS)
+        self.addCleanup(self.connection.close)
+
+    def pragma(self, name):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        # NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_transaction_takes_write_lock_at_once(self):
+        """BEGIN IMMEDIATE: чужой писатель не начнёт, пока блок открыт"""
+        with transaction.atomic(using=ALIAS):
+            self.pragma('user_version')
+            self.assertTrue(write_lock(self.path).locked())
+            other = sqlite3.connect(self.path, timeout=0)
+            with self.assertRaisesMessage(
+                    sqlite3.OperationalError, 'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+            other.close()
+        self.assertFalse(write_lock(self.path).locked())
+
+
+class DbConcurrencyCommandTest(SimpleTestCase):
+    def test_reports_modes(self):
+        out = StringIO()
+        call_command(
+            'db_concurrency', '--seconds=0.1', '--readers=1',
+            '--writers', '1', '2', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[-1].startswith('tuned'))
@@ -0,0 +1,90 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post, User
+
+
+@override_settings(METRICS_SAMPLE_RATE=1)
+class MetricsMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        metrics.reset()
+        cache.clear()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def totals(self, view_name):
+        return metrics._totals[view_name]
+
+    def test_records_request(self):
+        """Замер учитывает SQL, шаблоны и кэш запроса"""
+        self.client.get(reverse('posts:index'))
+        totals = self.totals('posts:index')
+        self.assertEqual(totals['requests'], 1)
+        self.assertGreater(totals['sql_queries'], 0)
+        self.assertGreater(totals['template_seconds'], 0)
+        self.assertGreater(totals['cache_misses'], 0)
+        self.client.get(reverse('posts:index'))
+        self.assertGreater(self.totals('posts:index')['cache_hits'], 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_skips_requests(self):
+        self.client.get(reverse('posts:index'))
+        self.assertNotIn('posts:index', metrics._totals)
+
+    @override_settings(METRICS_BUFFER_SIZE=2)
+    def test_ring_buffer_keeps_recent(self):
+        """В буфере только последние замеры, суммы — за всё время"""
+        for _ in range(3):
+            self.client.get(reverse('about:tech'))
+        self.assertEqual(len(metrics._recent['about:tech']), 2)
+        self.assertEqual(self.totals('about:tech')['requests'], 3)
+
+    def test_prometheus_endpoint(self):
+        self.client.get(reverse('posts:index'))
+        response = self.staff_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_request_seconds_count{view="posts:index"} 1', body)
+        self.assertIn('yatube_sql_queries_total{view="posts:index"}', body)
+        self.assertIn('quantile="0.99"', body)
+
+    def test_endpoint_closed_for_outsiders(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    def test_endpoint_closed_for_localhost(self):
+        """За прокси все запросы идут с 127.0.0.1 — адрес не даёт доступа"""
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_open_with_token(self):
+        url = reverse('metrics')
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_template_profile(self):
+        """Время рендеринга разбито по шаблонам, include учтены"""
+        author = User.objects.create_user(username='auth')
+        for number in range(3):
+            Post.objects.create(author=author, text=f'Пост {number}')
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            metrics._templates['includes/information_post.html'][0], 3)
+        self.assertGreater(metrics._templates['posts/index.html'][1], 0)
+        body = self.staff_client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_template_renders_total'
+            '{template="includes/information_post.html"} 3', body)
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import replicas
+from posts import follow_graph
+from posts.models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTest(TransactionTestCase):
+    # TestCase открыл бы транзакции и в default, и в зеркале-реплике,
+    # а это два соединения к одной базе SQLite в памяти
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def queries(self, url, client=None):
+        """Число запросов к default и к реплике при GET url."""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            (client or self.client).get(url)
+        return len(primary), len(replica)
+
+    def test_read_views_use_replica(self):
+        # Кэш подписок всегда заполняется с default
+        follow_graph.following_ids(self.user.pk)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                primary, replica = self.queries(url)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+
+    def test_write_pins_reads_to_primary(self):
+        """После записи пользователь читает свои данные с default"""
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'})
+        self.assertEqual(
+            response.cookies[replicas.PIN_COOKIE]['max-age'], 10)
+        primary, replica = self.queries(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_reads_without_writes_not_pinned(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_router(self):
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+        with replicas.reading_from_replica():
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            self.assertEqual(router.db_for_write(Post), 'default')
+            with override_settings(DATABASE_REPLICAS=[]):
+                self.assertEqual(router.db_for_read(Post), 'default')
+
+
+class ReplicaInTransactionTest(TestCase):
+    def test_atomic_reads_primary(self):
+        router = replicas.ReplicaRouter()
+        with override_settings(DATABASE_REPLICAS=['replica']), \
+                replicas.reading_from_replica(), transaction.atomic():
+            self.assertEqual(router.db_for_read(Post), 'default')
@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import slow_queries
+from posts.models import Post, User
+
+
+class FingerprintTest(TestCase):
+    def test_literals_normalized(self):
+        """Запросы, отличающиеся только литералами, совпадают"""
+        self.assertEqual(
+            slow_queries.fingerprint(
+                "SELECT * FROM t WHERE id = 1 AND name = 'a''b'"),
+            slow_queries.fingerprint(
+                "SELECT * FROM t WHERE id = 25 AND name = 'c'"),
+        )
+
+    def test_in_lists_collapsed(self):
+        self.assertEqual(
+            slow_queries.fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+            slow_queries.fingerprint(
+                'SELECT * FROM t WHERE id IN (%s, %s,  %s)'),
+        )
+
+    def test_bulk_values_collapsed(self):
+        self.assertEqual(
+            slow_queries.fingerprint('INSERT INTO t VALUES (%s, %s)'),
+            slow_queries.fingerprint(
+                'INSERT INTO t VALUES (%s, %s), (%s, %s)'),
+        )
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        slow_queries.reset()
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_query_logged_with_path_and_stack(self):
+        author = User.objects.create_user(username='auth')
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('posts:profile', args=[author]))
+        message = '\n'.join(logs.output)
+        self.assertIn('/profile/auth/', message)
+        self.assertIn('posts/views.py', message)
+
+    def test_command_shows_top_queries(self):
+        """slow_queries выводит накопленные отпечатки"""
+        author = User.objects.create_user(username='auth')
+        for number in range(3):
+            Post.objects.create(author=author, text=f'Пост {number}')
+        out = StringIO()
+        call_command('slow_queries', '--order=count', stdout=out)
+        self.assertIn('INSERT INTO "posts_post"', out.getvalue())
+        call_command('slow_queries', '--reset', stdout=StringIO())
+        out = StringIO()
+        call_command('slow_queries', stdout=out)
+        self.assertIn('Статистика запросов пуста', out.getvalue())
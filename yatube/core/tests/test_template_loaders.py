@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context, Engine
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+LOADER = 'core.template_loaders.Loader'
+
+PRODUCTION_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                (LOADER, [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ]),
+        ],
+    },
+}]
+
+
+def engine(templates):
+    return Engine(loaders=[
+        (LOADER, [('django.template.loaders.locmem.Loader', templates)]),
+    ])
+
+
+class InliningLoaderTest(TestCase):
+    def test_constant_include_inlined(self):
+        template = engine({
+            'page.html': "{% for x in items %}{% include 'item.html' %}"
+                         "{% endfor %}",
+            'item.html': "<{{ x }}>{% include 'mark.html' %}",
+            'mark.html': '!',
+        }).get_template('page.html')
+        self.assertEqual(
+            template.source,
+            '{% for x in items %}<{{ x }}>!{% endfor %}')
+        self.assertEqual(
+            template.render(Context({'items': [1, 2]})), '<1>!<2>!')
+
+    def test_dynamic_and_block_includes_kept(self):
+        """include с with, переменной или наследованием не трогаем"""
+        source = (
+            "{% include 'block.html' %}{% include name %}"
+            "{% include 'plain.html' with x=1 %}"
+        )
+        template = engine({
+            'page.html': source,
+            'block.html': '{% block b %}{% endblock %}',
+            'plain.html': '{{ x }}',
+        }).get_template('page.html')
+        self.assertEqual(template.source, source)
+        self.assertEqual(
+            template.render(Context({'name': 'plain.html'})), '1')
+
+
+class ProductionTemplatesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='auth')
+        group = Group.objects.create(title='Группа', slug='group')
+        for number in range(3):
+            Post.objects.create(
+                author=author, group=group, text=f'Пост {number}')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[group.slug]),
+            reverse('posts:profile', args=[author.username]),
+        )
+
+    def test_pages_render_the_same(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                cache.clear()
+                expected = self.client.get(url).content
+                cache.clear()
+                with override_settings(TEMPLATES=PRODUCTION_TEMPLATES):
+                    response = self.client.get(url)
+                self.assertEqual(response.content, expected)
+                self.assertTemplateNotUsed(
+                    response, 'includes/information_post.html')
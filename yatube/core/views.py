@@ -1,5 +1,12 @@
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +22,20 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        return False
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return hmac.compare_digest(header, f'Bearer {token}')
+
+
+def metrics_view(request):
+    if not request.user.is_staff and not has_metrics_token(request):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 
 from .models import Comment, Follow, Group, Post
+from .search import has_index, search_posts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +18,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not has_index():
+            return super().get_search_results(
+                request, queryset, search_term)
+        found = search_posts(search_term, timezone.now()).values('pk')
+        return queryset.filter(pk__in=found), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
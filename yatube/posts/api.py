@@ -0,0 +1,207 @@
+"""JSON API лент и постов.
+
+Посты выбираются через values() без создания моделей и листаются
+курсорами KeysetPaginator. Ответы лент поддерживают условные
+запросы: ETag и Last-Modified из posts.conditional. Из записи есть
+только пакетная подписка и отписка.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import (condition, require_POST,
+                                          require_safe)
+
+from .cache import feed_version
+from .conditional import (feed_etag, feed_last_modified, feed_state,
+                          make_etag)
+from .follows import follow_many, resolve, suggestions, unfollow_many
+from .models import Comment, Post
+from .timeline import FEED_KEYS, follow_feed, following_posts
+from .utils import KeysetPaginator
+
+POST_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'author__username',
+    'group__slug',
+    'image',
+    'comments_count',
+)
+
+COMMENT_FIELDS = ('id', 'author__username', 'text', 'created')
+
+
+def serialize_post(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': default_storage.url(row['image']) if row['image'] else None,
+        'comments_count': row['comments_count'],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'author': row['author__username'],
+        'text': row['text'],
+        'created': row['created'].isoformat(),
+    }
+
+
+def not_found():
+    return JsonResponse({'detail': 'Не найдено.'}, status=404)
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Требуется авторизация.'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def feed_response(request, posts, **keyset_options):
+    paginator = KeysetPaginator(
+        posts, settings.POSTS_ON_PAGE, **keyset_options)
+    page = paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        last='last' in request.GET,
+    )
+    return JsonResponse({
+        'results': [serialize_post(row) for row in page],
+        'next': page.next_cursor if page.has_next() else None,
+        'previous': (
+            page.previous_cursor if page.has_previous() else None),
+    })
+
+
+@require_safe
+@condition(feed_etag('index'), feed_last_modified('index'))
+def index(request):
+    return feed_response(request, Post.objects.values(*POST_FIELDS))
+
+
+@require_safe
+@condition(feed_etag('group'), feed_last_modified('group'))
+def group_posts(request, slug):
+    group_id = feed_state(request, 'group', slug=slug)[0]
+    if group_id is None:
+        return not_found()
+    return feed_response(
+        request, Post.objects.filter(group_id=group_id).values(*POST_FIELDS))
+
+
+@require_safe
+@condition(feed_etag('profile'), feed_last_modified('profile'))
+def profile(request, username):
+    author_id = feed_state(request, 'profile', username=username)[0]
+    if author_id is None:
+        return not_found()
+    return feed_response(
+        request,
+        Post.objects.filter(author_id=author_id).values(*POST_FIELDS))
+
+
+@require_safe
+@api_login_required
+@condition(feed_etag('follow'), feed_last_modified('follow'))
+def follow_index(request):
+    if not settings.FOLLOW_TIMELINE:
+        return feed_response(
+            request, following_posts(request.user).values(*POST_FIELDS))
+    entries, heavy = follow_feed(request.user)
+    return feed_response(
+        request,
+        entries.values(*POST_FIELDS, *FEED_KEYS),
+        keys=FEED_KEYS,
+        merge_with=[posts.values(*POST_FIELDS, *FEED_KEYS)
+                    for posts in heavy],
+    )
+
+
+@require_POST
+@api_login_required
+@transaction.atomic
+def follow_bulk(request):
+    """Подписка на авторов из follow и отписка от авторов из unfollow.
+
+    Имена передаются повторяющимися полями формы, не больше
+    FOLLOW_BULK_LIMIT за запрос.
+    """
+    follow = request.POST.getlist('follow')
+    unfollow = request.POST.getlist('unfollow')
+    if len(follow) + len(unfollow) > settings.FOLLOW_BULK_LIMIT:
+        return JsonResponse({
+            'detail': f'Не больше {settings.FOLLOW_BULK_LIMIT} имён.'
+        }, status=400)
+    ids = resolve(follow + unfollow)
+    names = {pk: username for username, pk in ids.items()}
+    followed = follow_many(
+        request.user, [ids[name] for name in follow if name in ids])
+    unfollowed = unfollow_many(
+        request.user, [ids[name] for name in unfollow if name in ids])
+    return JsonResponse({
+        'followed': sorted(names[pk] for pk in followed),
+        'unfollowed': sorted(names[pk] for pk in unfollowed),
+        'not_found': sorted(set(follow + unfollow) - set(ids)),
+    })
+
+
+@require_safe
+@api_login_required
+def follow_suggestions(request):
+    try:
+        limit = min(int(request.GET.get('limit', '')),
+                    settings.FOLLOW_SUGGESTIONS_LIMIT)
+    except ValueError:
+        limit = settings.FOLLOW_SUGGESTIONS_LIMIT
+    return JsonResponse({
+        'results': [
+            {'username': username, 'score': score}
+            for username, score in suggestions(request.user, max(limit, 0))
+        ],
+    })
+
+
+def post_etag(request, post_id):
+    """Правка поста меняет версию профиля автора, комментарий — счётчик."""
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'comments_count').first()
+    if post is None:
+        return None
+    return make_etag(
+        'post', post_id, post['comments_count'],
+        feed_version('profile', post['author_id']),
+        request.get_full_path(),
+    )
+
+
+@require_safe
+@condition(etag_func=post_etag)
+def post_detail(request, post_id):
+    post = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if post is None:
+        return not_found()
+    paginator = KeysetPaginator(
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        settings.COMMENTS_ON_PAGE,
+        keys=('created', 'id'),
+    )
+    comments = paginator.get_cursor_page(after=request.GET.get('after'))
+    return JsonResponse({
+        **serialize_post(post),
+        'comments': [serialize_comment(row) for row in comments],
+        'comments_next': (
+            comments.next_cursor if comments.has_next() else None),
+    })
@@ -0,0 +1,80 @@
+"""Версии кэша лент.
+
+У каждой ленты (главная, группа, профиль, подписки) есть версия
+в кэше — время её смены. Сигналы моделей пишут новую при изменениях,
+а фрагменты шаблонов кэшируются с версией в ключе — устаревший
+фрагмент просто перестаёт запрашиваться. Сигналы срабатывают внутри
+транзакции, поэтому версия меняется ещё раз после фиксации:
+иначе читатель, пришедший до неё, положил бы старые данные под
+новой версией.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'feed_version'
+
+
+def scope_key(name, pk=None):
+    if pk is None:
+        return f'{KEY_PREFIX}:{name}'
+    return f'{KEY_PREFIX}:{name}:{pk}'
+
+
+def _new_version():
+    # Новое значение, а не incr: incr у FileBasedCache — это get и set,
+    # и два процесса записали бы одну версию для разных данных. Версия
+    # после вытеснения из кэша тоже не совпадёт со старой
+    return time.time_ns()
+
+
+def get_version(name, pk=None):
+    key = scope_key(name, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _set_version(key):
+    # delete сбрасывает старую версию в LRU других процессов TieredCache
+    cache.delete(key)
+    cache.set(key, _new_version(), None)
+
+
+def bump(name, pk=None):
+    key = scope_key(name, pk)
+    _set_version(key)
+    transaction.on_commit(lambda: _set_version(key))
+
+
+def feed_version(name, pk=None):
+    """Строка версии ленты для ключа кэша.
+
+    Лента подписок зависит и от подписок пользователя, и от любых
+    изменений постов, поэтому включает версию главной. Профиль
+    показывает названия групп постов и включает версию групп.
+    """
+    versions = [get_version(name, pk)]
+    if name == 'follow':
+        versions.append(get_version('index'))
+    elif name == 'profile':
+        versions.append(get_version('groups'))
+    return '.'.join(map(str, versions))
+
+
+def changed_at(version):
+    """Время последней смены версии из строки feed_version."""
+    stamp = max(map(int, version.split('.')))
+    return datetime.fromtimestamp(stamp / 10 ** 9, timezone.utc)
+
+
+def bump_post_feeds(author_id, *group_ids):
+    bump('index')
+    bump('profile', author_id)
+    for group_id in set(group_ids):
+        if group_id is not None:
+            bump('group', group_id)
@@ -0,0 +1,94 @@
+"""Валидаторы условных запросов к лентам.
+
+ETag — хэш версии ленты из posts.cache и полного пути запроса (курсор
+входит в путь). Last-Modified — время последней смены этой версии,
+поэтому его меняют и правка, и удаление постов; точность у него —
+секунда, как у HTTP-дат, и при If-None-Match он не проверяется.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from . import group_feed
+from .cache import changed_at, feed_version
+from .models import User
+
+
+def _scope_pk(request, name, slug=None, username=None):
+    """pk для версии ленты."""
+    if name == 'index':
+        return None
+    if name == 'follow':
+        return request.user.pk
+    if name == 'group':
+        group = group_feed.get_group(slug)
+        return group and group.pk
+    return User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+
+
+def feed_state(request, name, **kwargs):
+    """pk ленты и её версия, одна выборка на запрос."""
+    state = getattr(request, '_feed_state', None)
+    if state is None:
+        pk = _scope_pk(request, name, **kwargs)
+        state = request._feed_state = (pk, feed_version(name, pk))
+    return state
+
+
+def make_etag(*parts):
+    return hashlib.md5(
+        '|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def user_state(request):
+    """Что в HTML зависит от пользователя: он сам и его подписки."""
+    if not request.user.is_authenticated:
+        return ('anonymous',)
+    return request.user.pk, feed_version('follow', request.user.pk)
+
+
+def feed_etag(name, per_user=False):
+    """etag_func для django.views.decorators.http.condition.
+
+    per_user — для HTML, где шапка и кнопки подписки зависят
+    от пользователя.
+    """
+    def etag(request, **kwargs):
+        parts = [name, *feed_state(request, name, **kwargs),
+                 request.get_full_path()]
+        if per_user:
+            parts += user_state(request)
+        return make_etag(*parts)
+    return etag
+
+
+def feed_last_modified(name):
+    """last_modified_func для django.views.decorators.http.condition."""
+    def last_modified(request, **kwargs):
+        return changed_at(feed_state(request, name, **kwargs)[1])
+    return last_modified
+
+
+def feed_cache_headers(view):
+    """Cache-Control и Vary для HTML-лент.
+
+    Анонимные ответы одинаковы для всех, их может отдавать прокси
+    FEED_CACHE_MAX_AGE секунд. Ответы пользователю приватные
+    и перепроверяются по ETag при каждом показе.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code not in (200, 304):
+            return response
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=settings.FEED_CACHE_MAX_AGE)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
@@ -0,0 +1,68 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным UPDATE ... SET x = x + 1 из сигналов,
+reconcile() пересчитывает их пакетно, если они разошлись с данными.
+"""
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def _add(queryset, field, delta):
+    # Счётчик не уходит ниже нуля, даже если он уже разошёлся с данными
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def add_to_author(user_id, field, delta):
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if not _add(stats, field, delta) and delta > 0:
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        _add(stats, field, delta)
+
+
+def add_to_authors(user_ids, field, delta):
+    """Как add_to_author, одним UPDATE для многих авторов."""
+    _add(AuthorStats.objects.filter(user_id__in=user_ids), field, delta)
+
+
+def add_to_post(post_id, delta):
+    _add(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def _count(queryset, field):
+    """Число строк queryset, у которых field равно pk внешней строки."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def _repair(queryset, field, expected):
+    return queryset.filter(~Q(**{field: expected})).update(
+        **{field: expected})
+
+
+def reconcile():
+    """Исправляет расхождения счётчиков, возвращает число исправлений."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True)
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=user_id) for user_id in missing],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    stats = AuthorStats.objects.all()
+    return {
+        'posts_count': _repair(
+            stats, 'posts_count', _count(Post.objects, 'author')),
+        'followers_count': _repair(
+            stats, 'followers_count', _count(Follow.objects, 'author')),
+        'following_count': _repair(
+            stats, 'following_count', _count(Follow.objects, 'user')),
+        'comments_count': _repair(
+            Post.objects.all(), 'comments_count',
+            _count(Comment.objects, 'post')),
+    }
@@ -0,0 +1,53 @@
+"""Кэш подписок: на кого подписан пользователь.
+
+Для каждого пользователя в кэше лежит отсортированный массив id
+авторов (array('I'), 4 байта на подписку). Проверка подписки — бинарный
+поиск по массиву, список авторов для ленты подписок берётся из него же.
+Сигналы Follow удаляют запись пользователя, и следующий запрос читает
+подписки из базы заново.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Follow
+
+KEY_PREFIX = 'follow_graph'
+
+
+def graph_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def following_ids(user_id):
+    """Отсортированный array('I') id авторов, на которых подписан user."""
+    key = graph_key(user_id)
+    packed = cache.get(key)
+    ids = array('I')
+    if packed is None:
+        # Реплика может отставать, а устаревший список прожил бы
+        # в кэше весь FOLLOW_GRAPH_TIMEOUT
+        ids.extend(
+            Follow.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+            .order_by('author_id').values_list('author_id', flat=True))
+        cache.set(key, ids.tobytes(), settings.FOLLOW_GRAPH_TIMEOUT)
+    else:
+        ids.frombytes(packed)
+    return ids
+
+
+def is_following(user_id, author_id):
+    ids = following_ids(user_id)
+    position = bisect_left(ids, author_id)
+    return position < len(ids) and ids[position] == author_id
+
+
+def invalidate(user_id):
+    key = graph_key(user_id)
+    cache.delete(key)
+    # Пока транзакция не закрыта, параллельный запрос мог снова
+    # положить в кэш старые подписки
+    transaction.on_commit(lambda: cache.delete(key))
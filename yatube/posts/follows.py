@@ -0,0 +1,137 @@
+"""Пакетные подписки и рекомендации «на кого подписаться».
+
+follow_many и unfollow_many пишут подписки пакетом: bulk_create
+не шлёт сигналов Follow, а удаление идёт с выключенными сигналами
+(in_batch). Счётчики, ленты подписок и кэши обновляются здесь же,
+пакетно. Рекомендации строятся по таблице CoFollow, которую
+периодически пересчитывает команда rebuild_cofollows.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+
+from . import cache, counters, follow_graph, timeline
+from .models import AuthorStats, CoFollow, Follow, User
+
+
+_local = threading.local()
+
+
+@contextmanager
+def _batch():
+    _local.batch = True
+    try:
+        yield
+    finally:
+        _local.batch = False
+
+
+def in_batch():
+    """Сигналы Follow пропускают подписки, которые пишет этот модуль."""
+    return getattr(_local, 'batch', False)
+
+
+def resolve(usernames):
+    """{username: id} для существующих пользователей, один запрос."""
+    return dict(User.objects.filter(username__in=set(usernames))
+                .values_list('username', 'pk'))
+
+
+def _changed(user_id, author_ids):
+    cache.bump('follow', user_id)
+    cache.bump('profile', user_id)
+    for author_id in author_ids:
+        cache.bump('profile', author_id)
+    follow_graph.invalidate(user_id)
+
+
+def follow_many(user, author_ids):
+    """Подписывает user на авторов, возвращает id новых подписок."""
+    existing = set(Follow.objects.filter(
+        user=user, author_id__in=author_ids).values_list(
+            'author_id', flat=True))
+    new_ids = set(author_ids) - existing - {user.pk}
+    if not new_ids:
+        return set()
+    # Параллельная подписка на того же автора не упадёт
+    # на unique_following
+    Follow.objects.bulk_create(
+        [Follow(user=user, author_id=author_id) for author_id in new_ids],
+        ignore_conflicts=True,
+    )
+    # bulk_create с ignore_conflicts не сообщает, какие строки вставлены.
+    # Вызывающий держит транзакцию, поэтому новые строки после existing —
+    # наши
+    new_ids = set(Follow.objects.filter(
+        user=user, author_id__in=new_ids).values_list(
+            'author_id', flat=True)) - existing
+    if not new_ids:
+        return set()
+    counters.add_to_authors(new_ids, 'followers_count', 1)
+    counters.add_to_author(user.pk, 'following_count', len(new_ids))
+    if settings.FOLLOW_TIMELINE:
+        timeline.backfill_many(user.pk, new_ids)
+    _changed(user.pk, new_ids)
+    return new_ids
+
+
+def unfollow_many(user, author_ids):
+    """Отписывает user от авторов, возвращает id снятых подписок."""
+    follows = Follow.objects.filter(user=user, author_id__in=author_ids)
+    removed = set(follows.values_list('author_id', flat=True))
+    if not removed:
+        return set()
+    with _batch():
+        follows.delete()
+    counters.add_to_authors(removed, 'followers_count', -1)
+    counters.add_to_author(user.pk, 'following_count', -len(removed))
+    if settings.FOLLOW_TIMELINE:
+        timeline.drop(user.pk, *removed)
+    _changed(user.pk, removed)
+    return removed
+
+
+def suggestions(user, limit):
+    """Авторы, на которых чаще всего подписаны подписчики тех же авторов.
+
+    Без подписок — самые популярные авторы. Список пар (username, score).
+    """
+    following = follow_graph.following_ids(user.pk).tolist()
+    if following:
+        rows = CoFollow.objects.filter(author_id__in=following).exclude(
+            other_id__in=[*following, user.pk]
+        ).values('other__username').annotate(
+            score=Sum('count')
+        ).order_by('-score', 'other__username')
+        return [(row['other__username'], row['score'])
+                for row in rows[:limit]]
+    rows = AuthorStats.objects.filter(followers_count__gt=0).exclude(
+        user_id=user.pk
+    ).order_by('-followers_count').values_list(
+        'user__username', 'followers_count')
+    return list(rows[:limit])
+
+
+def rebuild_cofollows(min_count=1):
+    """Пересчитывает CoFollow, возвращает число пар.
+
+    Пара (author, other) попадает в таблицу, если у них не меньше
+    min_count общих подписчиков.
+    """
+    CoFollow.objects.all().delete()
+    follow = connection.ops.quote_name(Follow._meta.db_table)
+    cofollow = connection.ops.quote_name(CoFollow._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {cofollow} (author_id, other_id, count) '
+            'SELECT a.author_id, b.author_id, COUNT(*) '
+            f'FROM {follow} a JOIN {follow} b '
+            f'ON b.user_id = a.user_id AND b.author_id != a.author_id '
+            'GROUP BY a.author_id, b.author_id '
+            'HAVING COUNT(*) >= %s',
+            [min_count],
+        )
+    return CoFollow.objects.count()
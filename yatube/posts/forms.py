@@ -1,9 +1,17 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from django.utils.formats import number_format
 
 from .models import Comment, Post
+from .uploads import strip_metadata
 
 
 class PostForm(forms.ModelForm):
+    """Пост с картинкой в пределах IMAGE_UPLOAD_* и без метаданных."""
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
@@ -13,6 +21,41 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Недописанный файл поле отклонило бы как битую картинку,
+        # поэтому он убирается из данных до проверки полей
+        key = self.add_prefix('image')
+        image = self.files.get(key)
+        self.image_too_large = image is not None and (
+            getattr(image, 'exceeded_limit', False)
+            or image.size > settings.IMAGE_UPLOAD_MAX_BYTES)
+        if self.image_too_large:
+            self.files = self.files.copy()
+            del self.files[key]
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if self.image_too_large:
+            raise ValidationError(
+                'Файл больше %(limit)s.',
+                code='too_large',
+                params={
+                    'limit': filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES)},
+            )
+        if not isinstance(image, UploadedFile):
+            return image
+        # Размеры из заголовка, который прочитало поле
+        width, height = image.image.size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка больше %(limit)s пикселей.',
+                code='too_many_pixels',
+                params={'limit': number_format(
+                    settings.IMAGE_UPLOAD_MAX_PIXELS, force_grouping=True)},
+            )
+        return strip_metadata(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,233 @@
+"""Группы по slug и первые страницы лент групп из кэша.
+
+Group по slug лежит в кэше (в проде — в LRU процесса перед общим
+кэшем), его сбрасывают сигналы Group. Для ленты группы в кэше хранятся
+id первых GROUP_FEED_PAGES страниц в порядке (-pub_date, -id), даты
+этих постов и общее число постов группы. Запрос к группе заполняет
+запись, сигналы Post удаляют её при новом, перенесённом или удалённом
+посте группы: правка на месте из нескольких процессов теряла бы
+параллельные изменения. Число постов лежит под отдельным ключом
+и меняется сигналами через incr, так что повторное заполнение
+не считает посты заново; после отката транзакции или неатомарного
+incr общего кэша оно может разойтись с базой до истечения
+GROUP_FEED_TIMEOUT. Записи редких групп вытесняются
+по GROUP_FEED_TIMEOUT. К базе из ленты идёт только выборка постов
+страницы по id; если посты не совпали с записью, она сбрасывается,
+а страница читается обычным запросом.
+"""
+import hashlib
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Group, Post
+
+GROUP_KEY_PREFIX = 'group_slug'
+FEED_KEY_PREFIX = 'group_feed'
+TOTAL_KEY_PREFIX = 'group_feed_total'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+MICROSECOND = timedelta(microseconds=1)
+
+
+def group_key(slug):
+    return f'{GROUP_KEY_PREFIX}:{hashlib.md5(slug.encode()).hexdigest()}'
+
+
+def feed_key(group_id):
+    return f'{FEED_KEY_PREFIX}:{group_id}'
+
+
+def total_key(group_id):
+    return f'{TOTAL_KEY_PREFIX}:{group_id}'
+
+
+def get_group(slug):
+    """Group по slug или None."""
+    key = group_key(slug)
+    group = cache.get(key)
+    if group is None:
+        group = Group.objects.filter(slug=slug).first()
+        if group is not None:
+            cache.set(key, group, settings.GROUP_CACHE_TIMEOUT)
+    return group
+
+
+def forget_group(*slugs):
+    cache.delete_many([group_key(slug) for slug in slugs if slug])
+
+
+def capacity():
+    # Ещё один пост, чтобы KeysetPaginator знал, есть ли дальше страница
+    return settings.GROUP_FEED_PAGES * settings.POSTS_ON_PAGE + 1
+
+
+def to_stamp(pub_date):
+    """Дата в целых микросекундах: точно, в отличие от float."""
+    return (pub_date - EPOCH) // MICROSECOND
+
+
+def post_key(post):
+    return -to_stamp(post.pub_date), -post.pk
+
+
+class FeedEntry:
+    """Ключи (-stamp, -id) первых постов группы по возрастанию.
+
+    complete — в keys все посты группы, total — их число.
+    """
+
+    def __init__(self, keys, total):
+        self.keys = keys
+        self.total = total
+
+    @property
+    def complete(self):
+        return len(self.keys) >= self.total
+
+    @classmethod
+    def load(cls, packed):
+        stamps, ids, total = packed
+        stamps = array('q', stamps)
+        ids = array('I', ids)
+        return cls([(-stamp, -pk) for stamp, pk in zip(stamps, ids)], total)
+
+    def pack(self):
+        stamps = array('q', (-stamp for stamp, pk in self.keys))
+        ids = array('I', (-pk for stamp, pk in self.keys))
+        return stamps.tobytes(), ids.tobytes(), self.total
+
+
+def _fill(group_id):
+    # Дальше запись правится сигналами, отставание реплики в ней
+    # осталось бы до GROUP_FEED_TIMEOUT
+    posts = Post.objects.using(DEFAULT_DB_ALIAS).filter(
+        group_id=group_id).order_by('-pub_date', '-id')
+    rows = posts.values_list('pub_date', 'id')[:capacity()]
+    keys = [(-to_stamp(pub_date), -pk) for pub_date, pk in rows]
+    total = len(keys)
+    if total == capacity():
+        total = cache.get(total_key(group_id))
+        if total is None:
+            total = posts.count()
+            cache.add(total_key(group_id), total,
+                      settings.GROUP_FEED_TIMEOUT)
+    entry = FeedEntry(keys, total)
+    cache.set(feed_key(group_id), entry.pack(), settings.GROUP_FEED_TIMEOUT)
+    return entry
+
+
+def get_entry(group_id):
+    packed = cache.get(feed_key(group_id))
+    if packed is None:
+        return _fill(group_id)
+    return FeedEntry.load(packed)
+
+
+def forget_feed(group_id, total=False):
+    """Сбрасывает запись ленты, с total — и число постов группы."""
+    keys = [feed_key(group_id)]
+    if total:
+        keys.append(total_key(group_id))
+    cache.delete_many(keys)
+    # Пока транзакция не закрыта, параллельный запрос мог снова
+    # заполнить запись старыми постами
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _add_to_total(group_id, delta):
+    try:
+        cache.incr(total_key(group_id), delta)
+    except ValueError:
+        # Числа нет в кэше — его посчитает следующее заполнение
+        pass
+
+
+def post_saved(post, created, previous_group_id=None):
+    """Сбрасывает ленты групп после сохранения поста."""
+    if not created and previous_group_id == post.group_id:
+        return
+    if previous_group_id is not None:
+        _add_to_total(previous_group_id, -1)
+    if post.group_id is not None:
+        _add_to_total(post.group_id, 1)
+    for group_id in {previous_group_id, post.group_id} - {None}:
+        forget_feed(group_id)
+
+
+def post_deleted(post):
+    if post.group_id is not None:
+        _add_to_total(post.group_id, -1)
+        forget_feed(post.group_id)
+
+
+def hydrate(group_id, keys):
+    """Посты по ключам записи в том же порядке.
+
+    None, если запись разошлась с базой (пост удалён или перенесён
+    мимо сигналов, транзакция откатилась): тогда запись сбрасывается.
+    """
+    ids = [-pk for stamp, pk in keys]
+    posts = Post.objects.select_related('author').in_bulk(ids)
+    rows = [posts.get(pk) for pk in ids]
+    if any(post is None or post.group_id != group_id
+           or post_key(post) != key for post, key in zip(rows, keys)):
+        forget_feed(group_id, total=True)
+        return None
+    return rows
+
+
+class GroupFeed:
+    """Посты группы для Paginator и KeysetPaginator.
+
+    Срезы и страницы в пределах записи собираются по id из кэша,
+    дальше — обычным запросом к queryset.
+    """
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.entry = get_entry(group_id)
+        self.queryset = Post.objects.filter(
+            group_id=group_id).select_related('author').order_by(
+                '-pub_date', '-id')
+
+    def count(self):
+        return self.entry.total
+
+    def __len__(self):
+        return self.entry.total
+
+    def _hydrate(self, start, stop):
+        """Посты [start:stop] из записи или None, если её не хватает."""
+        keys = self.entry.keys
+        if stop <= len(keys) or self.entry.complete:
+            return hydrate(self.group_id, keys[start:stop])
+        return None
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        rows = None
+        if index.stop is not None:
+            rows = self._hydrate(index.start or 0, index.stop)
+        if rows is None:
+            return list(self.queryset[index])
+        return rows
+
+    def keyset_slice(self, cursor, forward, limit):
+        """Строки для KeysetPaginator или None, если записи не хватает."""
+        if not forward:
+            return None
+        start = 0
+        if cursor is not None:
+            pub_date, pk = cursor
+            if (not isinstance(pub_date, datetime) or pub_date.tzinfo is None
+                    or not isinstance(pk, int)):
+                return None
+            start = bisect_right(self.entry.keys, (-to_stamp(pub_date), -pk))
+        return self._hydrate(start, start + limit)
@@ -0,0 +1,115 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.management.utils import rolled_back_database
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import encode_cursor
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN QUERY PLAN для запросов каждой ленты и падает, '
+        'если запрос сканирует таблицу целиком или сортирует во временном '
+        'B-tree.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--in-place',
+            action='store_true',
+            help='Проверять на текущей базе (данные откатываются), '
+                 'а не на временной тестовой.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Аудит поддерживает только SQLite.')
+        with rolled_back_database(options['in_place']):
+            problems = self.audit()
+        for label, sql, detail in problems:
+            self.stderr.write(f'{label}: {detail}\n    {sql}')
+        if problems:
+            raise CommandError(f'Проблемных запросов: {len(problems)}')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
+
+    def audit(self):
+        author = User.objects.create_user(username='audit_author')
+        reader = User.objects.create_user(username='audit_reader')
+        group = Group.objects.create(
+            title='audit', slug='audit-group', description='audit')
+        post = Post.objects.create(text='audit', author=author, group=group)
+        Comment.objects.create(post=post, author=reader, text='audit')
+        Follow.objects.create(user=reader, author=author)
+        cursor = encode_cursor((post.pub_date, post.pk))
+
+        guest = Client()
+        client = Client()
+        client.force_login(reader)
+        feeds = {
+            'index': reverse('posts:index'),
+            'group_posts': reverse('posts:group_list', args=[group.slug]),
+            'profile': reverse('posts:profile', args=[author.username]),
+        }
+        checks = []
+        for name, url in feeds.items():
+            checks += [
+                (name, guest, url, False),
+                (f'{name} (курсор)', guest, f'{url}?after={cursor}', False),
+                (f'{name} (назад)', guest, f'{url}?before={cursor}', False),
+                (f'{name} (страница)', guest, f'{url}?page=1', False),
+            ]
+        api_feeds = {
+            'api_index': reverse('posts:api_index'),
+            'api_group': reverse('posts:api_group', args=[group.slug]),
+            'api_profile': reverse('posts:api_profile', args=[author]),
+        }
+        for name, url in api_feeds.items():
+            checks += [
+                (name, guest, url, False),
+                (f'{name} (курсор)', guest, f'{url}?after={cursor}', False),
+            ]
+        checks += [
+            ('profile (подписчик)', client, feeds['profile'], False),
+            ('post_detail', guest,
+             reverse('posts:post_detail', args=[post.pk]), False),
+            ('api_post_detail', guest,
+             reverse('posts:api_post_detail', args=[post.pk]), False),
+        ]
+        follow_url = reverse('posts:follow_index')
+        for timeline in (False, True):
+            suffix = ' (timeline)' if timeline else ''
+            checks += [
+                (f'follow_index{suffix}', client, follow_url, timeline),
+                (f'follow_index{suffix} (курсор)', client,
+                 f'{follow_url}?after={cursor}', timeline),
+                (f'api_follow{suffix}', client,
+                 reverse('posts:api_follow'), timeline),
+            ]
+
+        problems = []
+        for label, http_client, url, timeline in checks:
+            with override_settings(FOLLOW_TIMELINE=timeline):
+                with CaptureQueriesContext(connection) as queries:
+                    http_client.get(url)
+            for query in queries.captured_queries:
+                problems += [
+                    (label, query['sql'], detail)
+                    for detail in self.plan_problems(query['sql'])
+                ]
+        return problems
+
+    def plan_problems(self, sql):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        return [
+            detail for detail in plan
+            if 'TEMP B-TREE' in detail
+            or (detail.startswith('SCAN ') and 'USING' not in detail
+                and 'CONSTANT ROW' not in detail)
+        ]
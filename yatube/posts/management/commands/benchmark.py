@@ -0,0 +1,251 @@
+import json
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from posts import counters, timeline
+from posts.management.utils import (
+    auto_now_add_disabled, rolled_back_database)
+from posts.models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 500
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(0, round(percent / 100 * len(ordered) + 0.5) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными и измеряет задержку, '
+        'число запросов и память для каждой страницы постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=50,
+                            help='Подписок на одного пользователя.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Запросов к каждой странице.')
+        parser.add_argument('--memory-samples', type=int, default=5,
+                            help='Запросов к странице с замером памяти.')
+        parser.add_argument('--warm', action='store_true',
+                            help='Не очищать кэш перед запросами.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json',
+                            help='Куда записать результаты в JSON.')
+        parser.add_argument('--compare',
+                            help='JSON прошлого прогона для сравнения.')
+        parser.add_argument(
+            '--in-place',
+            action='store_true',
+            help='Работать на текущей базе (данные откатываются), '
+                 'а не на временной тестовой.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        random.seed(options['seed'])
+        Faker.seed(options['seed'])
+        self.fake = Faker('ru_RU')
+        with rolled_back_database(options['in_place']):
+            results = self.run()
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.compare(json.load(file), results)
+
+    def run(self):
+        started = time.perf_counter()
+        self.seed()
+        seeded = time.perf_counter() - started
+        results = {
+            'created': timezone.now().isoformat(),
+            'dataset': {
+                name: self.options[name]
+                for name in ('users', 'groups', 'posts', 'comments',
+                             'follows', 'seed')
+            },
+            'seed_seconds': round(seeded, 2),
+            'warm_cache': self.options['warm'],
+        }
+        # Панель отладки в DEBUG съедает большую часть времени ответа
+        with override_settings(INTERNAL_IPS=[]):
+            results['views'] = self.measure()
+        return results
+
+    def seed(self):
+        options = self.options
+        fake = self.fake
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f'bench_{i}',
+                    first_name=fake.first_name(),
+                    last_name=fake.last_name(),
+                ) for i in range(options['users'])
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        groups = Group.objects.bulk_create(
+            Group(
+                title=fake.sentence(nb_words=3)[:200],
+                slug=f'bench-{i}',
+                description=fake.text(),
+            ) for i in range(options['groups'])
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith='bench_').values_list('pk', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith='bench-').values_list('pk', flat=True))
+        now = timezone.now()
+        with auto_now_add_disabled(Post, 'pub_date'):
+            Post.objects.bulk_create(
+                (
+                    Post(
+                        text=fake.text(),
+                        author_id=random.choice(user_ids),
+                        group_id=random.choice(group_ids + [None]),
+                        pub_date=now - timedelta(
+                            minutes=random.randint(0, 60 * 24 * 365)),
+                    ) for _ in range(options['posts'])
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        post_ids = list(Post.objects.filter(
+            author_id__in=user_ids).values_list('pk', flat=True))
+        with auto_now_add_disabled(Comment, 'created'):
+            Comment.objects.bulk_create(
+                (
+                    Comment(
+                        post_id=random.choice(post_ids),
+                        author_id=random.choice(user_ids),
+                        text=fake.sentence(),
+                        created=now - timedelta(
+                            minutes=random.randint(0, 60 * 24 * 365)),
+                    ) for _ in range(options['comments'])
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id in user_ids
+                for author_id in random.sample(
+                    user_ids, min(options['follows'], len(user_ids)))
+                if author_id != user_id
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        counters.reconcile()
+        timeline.rebuild()
+        self.user_ids = user_ids
+        self.group_slugs = [group.slug for group in groups]
+        self.post_ids = post_ids
+
+    def scenarios(self):
+        """Пары (страница, функция запроса) для замеров."""
+        reader = User.objects.get(pk=self.user_ids[0])
+        client = Client()
+        client.force_login(reader)
+        usernames = dict(User.objects.filter(
+            pk__in=self.user_ids).values_list('pk', 'username'))
+
+        def get(url_name, args=list):
+            return lambda: client.get(reverse(url_name, args=args()))
+
+        return {
+            'index': get('posts:index'),
+            'group_posts': get(
+                'posts:group_list',
+                lambda: [random.choice(self.group_slugs)]),
+            'profile': get(
+                'posts:profile',
+                lambda: [usernames[random.choice(self.user_ids)]]),
+            'post_detail': get(
+                'posts:post_detail', lambda: [random.choice(self.post_ids)]),
+            'follow_index': get('posts:follow_index'),
+            'create_post': lambda: client.post(
+                reverse('posts:create_post'), {'text': self.fake.text()}),
+        }
+
+    def measure(self):
+        results = {}
+        for name, request in self.scenarios().items():
+            timings = []
+            queries = []
+            for _ in range(self.options['requests']):
+                if not self.options['warm']:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = request()
+                    timings.append(time.perf_counter() - started)
+                queries.append(len(captured.captured_queries))
+                if response.status_code >= 400:
+                    self.stderr.write(
+                        f'{name}: ответ {response.status_code}')
+            memory = []
+            for _ in range(self.options['memory_samples']):
+                if not self.options['warm']:
+                    cache.clear()
+                # Новый start обнуляет и счётчики, и пик: reset_peak
+                # появился только в Python 3.9
+                tracemalloc.start()
+                try:
+                    request()
+                    memory.append(tracemalloc.get_traced_memory()[1])
+                finally:
+                    tracemalloc.stop()
+            results[name] = {
+                'p50_ms': round(percentile(timings, 50) * 1000, 2),
+                'p95_ms': round(percentile(timings, 95) * 1000, 2),
+                'p99_ms': round(percentile(timings, 99) * 1000, 2),
+                'queries': max(queries),
+                'peak_memory_kb': round(max(memory, default=0) / 1024, 1),
+            }
+        return results
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"страница":<14}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"p99, мс":>10}{"запросов":>10}{"память, КБ":>12}'
+        )
+        for name, row in results['views'].items():
+            self.stdout.write(
+                f'{name:<14}{row["p50_ms"]:>10}{row["p95_ms"]:>10}'
+                f'{row["p99_ms"]:>10}{row["queries"]:>10}'
+                f'{row["peak_memory_kb"]:>12}'
+            )
+
+    def compare(self, previous, results):
+        self.stdout.write('Изменения относительно прошлого прогона:')
+        for name, row in results['views'].items():
+            old = previous.get('views', {}).get(name)
+            if old is None:
+                continue
+            self.stdout.write(
+                f'{name:<14}p95 {row["p95_ms"] - old["p95_ms"]:+.2f} мс, '
+                f'запросов {row["queries"] - old["queries"]:+d}'
+            )
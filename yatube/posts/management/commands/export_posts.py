@@ -0,0 +1,62 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Post
+from posts.transfer import FIELDS, FORMATS, RowWriter, format_date
+
+QUERIES = {
+    'posts': lambda: Post.objects.values_list(
+        'id', 'text', 'pub_date', 'author__username', 'group__slug',
+        'image'),
+    'comments': lambda: Comment.objects.values_list(
+        'id', 'post_id', 'author__username', 'text', 'created'),
+}
+
+DATE_COLUMNS = {'posts': 2, 'comments': 4}
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты или комментарии в NDJSON или CSV потоком.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл или - для stdout.')
+        parser.add_argument(
+            '--type', choices=tuple(FIELDS), default='posts')
+        parser.add_argument(
+            '--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Строк, читаемых из базы за раз.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['path'] == '-':
+            count = self.export(sys.stdout, options)
+        else:
+            with open(options['path'], 'w', newline='',
+                      encoding='utf-8') as file:
+                count = self.export(file, options)
+        elapsed = time.perf_counter() - started
+        # Отчёт в stderr, чтобы не смешивать его с выгрузкой в stdout
+        self.stderr.write(
+            f'Выгружено {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с)'
+        )
+
+    def export(self, file, options):
+        row_type = options['type']
+        writer = RowWriter(file, options['format'], FIELDS[row_type])
+        date_column = DATE_COLUMNS[row_type]
+        rows = QUERIES[row_type]().order_by('id').iterator(
+            chunk_size=options['chunk_size'])
+        count = 0
+        for row in rows:
+            row = list(row)
+            row[date_column] = format_date(row[date_column])
+            writer.write(row)
+            count += 1
+        return count
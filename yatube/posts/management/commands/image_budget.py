@@ -0,0 +1,93 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def file_size(name):
+    try:
+        return default.storage.size(name)
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает объём картинок на страницах ленты: оригиналов и каждого '
+        'варианта формата и ширины.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1)
+        parser.add_argument('--group', help='Лента группы вместо главной.')
+        parser.add_argument(
+            '--geometry', choices=tuple(thumbnails.GEOMETRIES),
+            default='card')
+        parser.add_argument(
+            '--generate', action='store_true',
+            help='Сначала создать недостающие варианты.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.only('image', 'author_id', 'group_id')
+        if options['group']:
+            posts = posts.filter(group__slug=options['group'])
+        variants = thumbnails.variants(options['geometry'], float('inf'))
+        overall = Counter()
+        per_page = settings.POSTS_ON_PAGE
+        for number in range(options['pages']):
+            page = posts[number * per_page:(number + 1) * per_page]
+            page = [post for post in page if post.image]
+            if options['generate']:
+                for post in page:
+                    thumbnails.generate(
+                        post.image.name, post.author_id, post.group_id)
+            sizes, missing = Counter(), Counter()
+            for post in page:
+                self.measure(post, options['geometry'], sizes, missing)
+            overall += sizes
+            self.stdout.write(
+                f'Страница {number + 1}: картинок {len(page)}')
+            self.write_sizes(sizes, missing, variants)
+        if options['pages'] > 1:
+            self.stdout.write('В среднем на страницу:')
+            self.write_sizes(
+                Counter({key: size / options['pages']
+                         for key, size in overall.items()}),
+                Counter(), variants)
+
+    def measure(self, post, geometry, sizes, missing):
+        """Суммирует размеры оригинала и вариантов картинки поста.
+
+        Пока картинка не обработана, её ширина неизвестна, и
+        недостающими считаются все варианты.
+        """
+        size = file_size(post.image.name)
+        if size is None:
+            raise CommandError(f'Нет файла {post.image.name}')
+        sizes['original'] += size
+        source = thumbnails.source_image(post.image.name)
+        source_width = source.width if source else float('inf')
+        for image_format, width, geometry_string, options in (
+                thumbnails.variants(geometry, source_width)):
+            thumbnail = thumbnails.backend.cached_thumbnail(
+                post.image.name, geometry_string, **options)
+            size = thumbnail and file_size(thumbnail.name)
+            if size is None:
+                missing[image_format, width] += 1
+            else:
+                sizes[image_format, width] += size
+
+    def write_sizes(self, sizes, missing, variants):
+        self.stdout.write(
+            f'  {"оригинал":12} {sizes["original"] / 1024:10.1f} КБ')
+        for image_format, width, *_ in variants:
+            key = image_format, width
+            line = (f'  {image_format:5} {width:5}w '
+                    f'{sizes[key] / 1024:10.1f} КБ')
+            if missing[key]:
+                line += f'  (нет у {missing[key]})'
+            self.stdout.write(line)
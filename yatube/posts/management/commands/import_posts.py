@@ -0,0 +1,158 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import cache, counters, group_feed, timeline
+from posts.management.utils import auto_now_add_disabled
+from posts.models import Comment, Group, Post, User
+from posts.transfer import FIELDS, FORMATS, parse_date, parse_id, read_rows
+
+
+class Lookup:
+    """Кэш значение -> pk, промахи пачки решаются одним запросом."""
+
+    def __init__(self, queryset, field, maxsize=100000):
+        self.queryset = queryset
+        self.field = field
+        self.maxsize = maxsize
+        self.known = {}
+
+    def resolve(self, values):
+        missing = {value for value in values if value not in self.known}
+        if not missing:
+            return
+        if len(self.known) + len(missing) > self.maxsize:
+            self.known.clear()
+        found = dict(self.queryset.filter(
+            **{f'{self.field}__in': missing}).values_list(self.field, 'pk'))
+        for value in missing:
+            self.known[value] = found.get(value)
+
+    def __getitem__(self, value):
+        return self.known.get(value)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты или комментарии из NDJSON или CSV пачками '
+        'через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument(
+            '--type', choices=tuple(FIELDS), default='posts')
+        parser.add_argument(
+            '--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Строк в одной транзакции.')
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать строки с уже занятым id.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.users = Lookup(User.objects, 'username')
+        self.groups = Lookup(Group.objects, 'slug')
+        self.posts = Lookup(Post.objects, 'pk')
+        self.author_ids = set()
+        self.group_ids = set()
+        self.imported = self.skipped = 0
+        started = time.perf_counter()
+        if options['path'] == '-':
+            self.load(sys.stdin)
+        else:
+            with open(options['path'], newline='', encoding='utf-8') as file:
+                self.load(file)
+        with transaction.atomic():
+            counters.reconcile()
+            if options['type'] == 'posts' and settings.FOLLOW_TIMELINE:
+                timeline.rebuild()
+        if self.author_ids:
+            cache.bump('index')
+        for author_id in self.author_ids:
+            cache.bump('profile', author_id)
+        for group_id in self.group_ids - {None}:
+            cache.bump('group', group_id)
+            group_feed.forget_feed(group_id, total=True)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {self.imported}, пропущено {self.skipped} '
+            f'за {elapsed:.1f} с ({self.imported / max(elapsed, 1e-9):.0f} '
+            f'строк/с)'
+        ))
+
+    def load(self, file):
+        build = getattr(self, f'build_{self.options["type"]}')
+        batch = []
+        for row in read_rows(file, self.options['format']):
+            batch.append(row)
+            if len(batch) == self.options['batch_size']:
+                self.save(build, batch)
+                batch = []
+        self.save(build, batch)
+
+    def save(self, build, rows):
+        first_row = self.imported + self.skipped + 1
+        try:
+            objects = build(rows)
+        except (KeyError, ValueError) as error:
+            raise CommandError(
+                f'Ошибка в пачке со строки {first_row}: {error!r}')
+        if not objects:
+            return
+        model = type(objects[0])
+        field = 'pub_date' if model is Post else 'created'
+        with auto_now_add_disabled(model, field), transaction.atomic():
+            model.objects.bulk_create(
+                objects,
+                ignore_conflicts=self.options['ignore_conflicts'],
+            )
+        self.imported += len(objects)
+        if self.options['verbosity'] > 1:
+            self.stderr.write(f'Загружено {self.imported}')
+
+    def build_posts(self, rows):
+        self.users.resolve(row['author'] for row in rows)
+        self.groups.resolve(row['group'] for row in rows if row.get('group'))
+        posts = []
+        for row in rows:
+            author_id = self.users[row['author']]
+            group_id = self.groups[row['group']] if row.get('group') else None
+            if author_id is None or (row.get('group') and group_id is None):
+                self.skipped += 1
+                continue
+            self.author_ids.add(author_id)
+            self.group_ids.add(group_id)
+            posts.append(Post(
+                id=parse_id(row.get('id')),
+                text=row['text'],
+                pub_date=parse_date(row.get('pub_date')),
+                author_id=author_id,
+                group_id=group_id,
+                image=row.get('image') or '',
+            ))
+        return posts
+
+    def build_comments(self, rows):
+        self.users.resolve(row['author'] for row in rows)
+        self.posts.resolve(parse_id(row['post']) for row in rows)
+        comments = []
+        for row in rows:
+            author_id = self.users[row['author']]
+            post_id = self.posts[parse_id(row['post'])]
+            if author_id is None or post_id is None:
+                self.skipped += 1
+                continue
+            comments.append(Comment(
+                id=parse_id(row.get('id')),
+                post_id=post_id,
+                author_id=author_id,
+                text=row['text'],
+                created=parse_date(row.get('created')),
+            ))
+        return comments
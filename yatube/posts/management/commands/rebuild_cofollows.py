@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import follows
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает общих подписчиков авторов для рекомендаций '
+        '«на кого подписаться».'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-count', type=int, default=1,
+            help='Не хранить пары с меньшим числом общих подписчиков.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            pairs = follows.rebuild_cofollows(options['min_count'])
+        self.stdout.write(self.style.SUCCESS(f'Пар авторов: {pairs}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает по лентам подписок посты авторов, у которых '
+        'подписчиков снова не больше TIMELINE_FANOUT_LIMIT. '
+        'Запускается по расписанию при включённом FOLLOW_TIMELINE.'
+    )
+
+    def handle(self, *args, **options):
+        before = TimelineEntry.objects.count()
+        with transaction.atomic():
+            timeline.refill_light()
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено записей: {TimelineEntry.objects.count() - before}'
+        ))
@@ -0,0 +1,37 @@
+"""Вспомогательные функции для команд управления."""
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+
+@contextmanager
+def auto_now_add_disabled(model, *field_names):
+    """Позволяет задать даты с auto_now_add при массовой загрузке."""
+    fields = [model._meta.get_field(name) for name in field_names]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def rolled_back_database(in_place=False):
+    """Транзакция, которая всегда откатывается, для замеров команд.
+
+    Без in_place — во временной тестовой базе, а не в текущей.
+    """
+    old_name = None
+    if not in_place:
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with transaction.atomic():
+            yield
+            transaction.set_rollback(True)
+    finally:
+        if old_name is not None:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
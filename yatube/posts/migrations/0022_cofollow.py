@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0021_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoFollow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(verbose_name='Общих подписчиков')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Общие подписчики',
+                'verbose_name_plural': 'Общие подписчики',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cofollow',
+            constraint=models.UniqueConstraint(fields=('author', 'other'), name='unique_cofollow'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+"""Кэш целых страниц лент для анонимных посетителей.
+
+Ключ строится из имени ленты, её версии и полного пути запроса,
+поэтому сигналы Post и Group, меняющие версию, делают старые страницы
+недостижимыми. Пользователи с входом в систему идут мимо кэша:
+шапка и переключатель лент у них свои.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .conditional import feed_state
+
+KEY_PREFIX = 'page_cache'
+
+
+def page_key(request, name, **kwargs):
+    pk, version = feed_state(request, name, **kwargs)
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'{KEY_PREFIX}:{name}:{pk}:{version}:{path}'
+
+
+def anonymous_page_cache(name):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, **kwargs)
+            key = page_key(request, name, **kwargs)
+            response = cache.get(key)
+            if response is not None:
+                return response
+            response = view(request, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,121 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite поиск идёт по индексу FTS5 posts_post_fts, который
+поддерживают триггеры из миграции 0021. Релевантность bm25 делится
+на (1 + возраст поста в днях / SEARCH_RECENCY_DAYS), так что свежие
+посты поднимаются выше. На других базах и без FTS5 поиск сводится
+к icontains с сортировкой по дате.
+
+Результаты листаются курсором (score, id); момент, от которого
+считается возраст, передаётся в параметре at, чтобы оценки постов
+не менялись между страницами.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Post
+from .utils import KeysetPaginator
+
+FTS_TABLE = 'posts_post_fts'
+
+SEARCH_KEYS = ('score', 'id')
+
+_has_index = {}
+
+
+def has_index():
+    """Есть ли в текущей базе индекс FTS5."""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _has_index:
+        _has_index[name] = (
+            FTS_TABLE in connection.introspection.table_names())
+    return _has_index[name]
+
+
+def terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def match_expression(words):
+    """Запрос FTS5: все слова, каждое как префикс."""
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def parse_reference(value):
+    """Момент отсчёта возраста из параметра at, по умолчанию — сейчас."""
+    reference = value and parse_datetime(value)
+    if reference is None:
+        return timezone.now().replace(microsecond=0)
+    if timezone.is_naive(reference):
+        reference = timezone.make_aware(reference, timezone.utc)
+    return reference
+
+
+def search_posts(query, reference, group=None, author=None):
+    """Посты по запросу с аннотацией score, не отсортированные."""
+    words = terms(query)
+    if not words:
+        return Post.objects.annotate(
+            score=Value(0.0, output_field=FloatField())).none()
+    if has_index():
+        score = RawSQL(
+            f'-bm25({FTS_TABLE}) / (1 + (julianday(%s) - '
+            'julianday(posts_post.pub_date)) / %s)',
+            (
+                connection.ops.adapt_datetimefield_value(reference),
+                settings.SEARCH_RECENCY_DAYS,
+            ),
+            output_field=FloatField(),
+        )
+        posts = Post.objects.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = posts_post.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[match_expression(words)],
+        ).annotate(score=score)
+    else:
+        posts = Post.objects.annotate(
+            score=Value(0.0, output_field=FloatField()))
+        for word in words:
+            posts = posts.filter(text__icontains=word)
+    if group:
+        posts = posts.filter(group__slug=group)
+    if author:
+        posts = posts.filter(author__username=author)
+    return posts.select_related('author', 'group')
+
+
+def get_search_page(request):
+    """Страница результатов поиска по параметрам запроса."""
+    reference = parse_reference(request.GET.get('at'))
+    posts = search_posts(
+        request.GET.get('q', ''),
+        reference,
+        group=request.GET.get('group'),
+        author=request.GET.get('author'),
+    )
+    paginator = KeysetPaginator(
+        posts, settings.POSTS_ON_PAGE, keys=SEARCH_KEYS)
+    page = paginator.get_cursor_page(after=request.GET.get('after'))
+    page.reference = reference
+    return page
+
+
+def next_query(request, page):
+    """Параметры ссылки на следующую страницу результатов."""
+    if not page.has_next():
+        return ''
+    params = request.GET.copy()
+    params['at'] = page.reference.isoformat()
+    params['after'] = page.next_cursor
+    return params.urlencode()
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, counters, follow_graph, follows, group_feed, timeline
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    if instance.pk:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance._previous_slug = None
+    if instance.pk:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.add_to_author(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.add_to_author(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.add_to_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.add_to_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.add_to_author(instance.author_id, 'followers_count', 1)
+        counters.add_to_author(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    if follows.in_batch():
+        return
+    counters.add_to_author(instance.author_id, 'followers_count', -1)
+    counters.add_to_author(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created and settings.FOLLOW_TIMELINE:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, **kwargs):
+    cache.bump_post_feeds(
+        instance.author_id,
+        instance.group_id,
+        getattr(instance, '_previous_group_id', None),
+    )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    cache.bump_post_feeds(instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    cache.bump('index')
+    cache.bump('groups')
+    cache.bump('group', instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and settings.FOLLOW_TIMELINE:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def drop_timeline(sender, instance, **kwargs):
+    if follows.in_batch():
+        return
+    if settings.FOLLOW_TIMELINE:
+        timeline.drop(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    if follows.in_batch():
+        return
+    cache.bump('follow', instance.user_id)
+    # Профили показывают число подписок и подписчиков
+    cache.bump('profile', instance.user_id)
+    cache.bump('profile', instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_graph(sender, instance, **kwargs):
+    if follows.in_batch():
+        return
+    follow_graph.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+def update_group_feed(sender, instance, created, **kwargs):
+    group_feed.post_saved(
+        instance, created, getattr(instance, '_previous_group_id', None))
+
+
+@receiver(post_delete, sender=Post)
+def update_deleted_group_feed(sender, instance, **kwargs):
+    group_feed.post_deleted(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_lookup(sender, instance, **kwargs):
+    group_feed.forget_group(
+        instance.slug, getattr(instance, '_previous_slug', None))
+    group_feed.forget_feed(instance.pk, total=True)
@@ -0,0 +1,10 @@
+from django import template
+
+from posts.cache import feed_version as get_feed_version
+
+register = template.Library()
+
+
+@register.simple_tag
+def feed_version(name, pk=None):
+    return get_feed_version(name, pk)
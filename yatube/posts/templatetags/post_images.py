@@ -0,0 +1,15 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(post, geometry):
+    return thumbnails.thumbnail_url(post, geometry)
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post, geometry):
+    return {'picture': thumbnails.picture(post, geometry)}
@@ -0,0 +1,231 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import follow_graph
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry, User)
+from posts.timeline import rebuild
+from posts.utils import encode_cursor
+
+
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = self.client_class()
+        self.reader_client.force_login(self.reader)
+
+    def test_index(self):
+        response = self.client.get(reverse('posts:api_index'))
+        self.assertEqual(response.json()['results'], [{
+            'id': self.post.pk,
+            'text': 'Тестовый пост',
+            'pub_date': self.post.pub_date.isoformat(),
+            'author': 'auth',
+            'group': 'group',
+            'image': None,
+            'comments_count': 0,
+        }])
+
+    def test_cursor_pagination(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}')
+            for i in range(settings.POSTS_ON_PAGE)
+        )
+        url = reverse('posts:api_profile', args=['auth'])
+        first = self.client.get(url).json()
+        second = self.client.get(url, {'after': first['next']}).json()
+        self.assertEqual(len(first['results']), settings.POSTS_ON_PAGE)
+        self.assertEqual(
+            [post['id'] for post in second['results']], [self.post.pk])
+        self.assertIsNone(second['next'])
+
+    def test_group_and_missing_feeds(self):
+        response = self.client.get(reverse('posts:api_group', args=['group']))
+        self.assertEqual(len(response.json()['results']), 1)
+        for url in (reverse('posts:api_group', args=['missing']),
+                    reverse('posts:api_profile', args=['missing']),
+                    reverse('posts:api_post_detail', args=[0])):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 до изменения ленты"""
+        url = reverse('posts:api_index')
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        ).status_code, 304)
+        Post.objects.get(pk=self.post.pk).save()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified_changes_on_edit(self):
+        """Правка поста меняет Last-Modified, а не только ETag"""
+        url = reverse('posts:api_index')
+        last_modified = self.client.get(url)['Last-Modified']
+        later = time.time_ns() + 2 * 10 ** 9
+        with mock.patch('posts.cache.time.time_ns', return_value=later):
+            post = Post.objects.get(pk=self.post.pk)
+            post.text = 'Исправленный пост'
+            post.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'][0]['text'], 'Исправленный пост')
+
+    def test_cursor_with_wrong_types(self):
+        for values in (['not-a-date', 1], [{'a': 1}, 1], [
+                self.post.pub_date.isoformat(), 'zz']):
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse('posts:api_index'),
+                    {'after': encode_cursor(values)})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), 1)
+
+    def test_etag_depends_on_cursor(self):
+        url = reverse('posts:api_index')
+        self.assertNotEqual(
+            self.client.get(url)['ETag'],
+            self.client.get(url, {'last': 1})['ETag'])
+
+    def test_follow_requires_login(self):
+        response = self.client.get(reverse('posts:api_follow'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_follow(self):
+        url = reverse('posts:api_follow')
+        self.assertEqual(self.reader_client.get(url).json()['results'], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        for timeline in (False, True):
+            with self.subTest(timeline=timeline), \
+                    override_settings(FOLLOW_TIMELINE=timeline):
+                if timeline:
+                    rebuild()
+                results = self.reader_client.get(url).json()['results']
+                self.assertEqual(
+                    [post['id'] for post in results], [self.post.pk])
+
+    def test_post_detail(self):
+        url = reverse('posts:api_post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['comments'], [])
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Коммент')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [comment['text'] for comment in response.json()['comments']],
+            ['Коммент'])
+
+
+class FollowBulkApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(3)
+        ]
+        cls.posts = [
+            Post.objects.create(author=author, text='Пост')
+            for author in cls.authors
+        ]
+        cls.url = reverse('posts:api_follow_bulk')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_requires_login_and_post(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.client.post(self.url).status_code, 401)
+
+    @override_settings(FOLLOW_TIMELINE=True)
+    def test_follow_and_unfollow(self):
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        with self.assertNumQueries(13):
+            response = self.client.post(self.url, {
+                'follow': ['author0', 'author1', 'author2', 'reader',
+                           'nobody'],
+            })
+        self.assertEqual(response.json(), {
+            'followed': ['author1', 'author2'],
+            'unfollowed': [],
+            'not_found': ['nobody'],
+        })
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(self.stats(self.reader).following_count, 3)
+        self.assertEqual(self.stats(self.authors[1]).followers_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3)
+
+        response = self.client.post(self.url, {
+            'unfollow': ['author0', 'author1'],
+        })
+        self.assertEqual(
+            response.json()['unfollowed'], ['author0', 'author1'])
+        self.assertEqual(
+            list(Follow.objects.values_list('author__username', flat=True)),
+            ['author2'])
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 0)
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('author', flat=True)),
+            [self.authors[2].pk])
+        self.assertEqual(
+            list(follow_graph.following_ids(self.reader.pk)),
+            [self.authors[2].pk])
+
+    @override_settings(FOLLOW_BULK_LIMIT=2)
+    def test_limit(self):
+        response = self.client.post(
+            self.url, {'follow': ['author0', 'author1', 'author2']})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_suggestions(self):
+        """Рекомендации по общим подписчикам, без своих подписок"""
+        url = reverse('posts:api_follow_suggestions')
+        for user in self.authors[1:]:
+            Follow.objects.create(user=user, author=self.authors[0])
+        Follow.objects.create(user=self.authors[1], author=self.authors[2])
+        Follow.objects.create(user=self.authors[2], author=self.authors[1])
+        # Без подписок — самые популярные авторы
+        self.assertEqual(self.client.get(url).json()['results'][0], {
+            'username': 'author0', 'score': 2})
+        call_command('rebuild_cofollows', stdout=StringIO())
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        self.assertEqual(self.client.get(url).json()['results'], [
+            {'username': 'author1', 'score': 1},
+            {'username': 'author2', 'score': 1},
+        ])
+        self.assertEqual(
+            len(self.client.get(url, {'limit': 1}).json()['results']), 1)
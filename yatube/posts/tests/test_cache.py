@@ -0,0 +1,36 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from core.cache import _stores
+from core.tests.test_cache import CACHES, make_worker
+from posts.cache import bump, get_version
+
+
+@override_settings(CACHES=CACHES)
+class FeedVersionTests(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        _stores.clear()
+        self.first = make_worker('worker-1')
+        self.second = make_worker('worker-2')
+
+    def test_bump_writes_new_value(self):
+        """Версия пишется заново, а не через неатомарный incr"""
+        with mock.patch('posts.cache.cache', self.first):
+            old = get_version('index')
+            with mock.patch.object(
+                    caches['shared'], 'incr', side_effect=AssertionError):
+                bump('index')
+            self.assertNotEqual(get_version('index'), old)
+
+    def test_bump_visible_in_other_workers(self):
+        with mock.patch('posts.cache.cache', self.second):
+            old = get_version('index')
+        with mock.patch('posts.cache.cache', self.first):
+            bump('index')
+            new = get_version('index')
+        with mock.patch('posts.cache.cache', self.second):
+            self.assertEqual(get_version('index'), new)
+        self.assertNotEqual(new, old)
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+class AuditIndexesCommandTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не сканируют таблицы и не сортируют в B-tree"""
+        out = StringIO()
+        call_command('audit_indexes', '--in-place', stdout=out,
+                     stderr=StringIO())
+        self.assertIn('Все запросы используют индексы', out.getvalue())
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_writes_results(self):
+        """benchmark замеряет каждую страницу и пишет JSON"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command(
+                'benchmark', '--in-place', '--users=5', '--groups=2',
+                '--posts=30', '--comments=30', '--follows=3',
+                '--requests=3', '--memory-samples=1', f'--output={output}',
+                stdout=StringIO(), stderr=StringIO(),
+            )
+            with open(output) as file:
+                results = json.load(file)
+        self.assertEqual(set(results['views']), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'create_post',
+        })
+        for row in results['views'].values():
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+            self.assertGreater(row['queries'], 0)
+        self.assertFalse(Post.objects.exists())
+
+
+class ImageBudgetCommandTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, THUMBNAIL_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        Post.objects.create(
+            author=User.objects.create_user(username='auth'),
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'budget.gif',
+                b'GIF89a\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff'
+                b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00'
+                b'\x00\x02\x02D\x01\x00;',
+                content_type='image/gif',
+            ),
+        )
+
+    def budget(self, *args):
+        out = StringIO()
+        call_command('image_budget', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_variants(self):
+        report = self.budget()
+        self.assertIn('Страница 1: картинок 1', report)
+        self.assertIn('(нет у 1)', report)
+        report = self.budget('--generate')
+        self.assertNotIn('(нет у', report)
+        self.assertIn('JPEG    320w', report)
+
+
+class ReconcileCountersCommandTest(TestCase):
+    def test_repairs_drift(self):
+        """reconcile_counters исправляет разошедшиеся счётчики"""
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        post = Post.objects.create(author=author, text='Пост')
+        Comment.objects.create(post=post, author=reader, text='Коммент')
+        Follow.objects.create(user=reader, author=author)
+        AuthorStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7)
+        AuthorStats.objects.filter(user=reader).delete()
+        Post.objects.update(comments_count=7)
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        author_stats = AuthorStats.objects.get(user=author)
+        reader_stats = AuthorStats.objects.get(user=reader)
+        post.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(author_stats.following_count, 0)
+        self.assertEqual(reader_stats.following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+
+class TransferCommandsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост, "с" запятой')
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Коммент')
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def export(self, row_type, file_format):
+        path = os.path.join(self.directory.name, f'{row_type}.{file_format}')
+        call_command('export_posts', path, f'--type={row_type}',
+                     f'--format={file_format}', stderr=StringIO())
+        return path
+
+    def import_file(self, path, row_type, file_format):
+        call_command('import_posts', path, f'--type={row_type}',
+                     f'--format={file_format}', '--batch-size=1',
+                     stdout=StringIO())
+
+    def check_round_trip(self, file_format):
+        posts = self.export('posts', file_format)
+        comments = self.export('comments', file_format)
+        Post.objects.all().delete()
+        self.import_file(posts, 'posts', file_format)
+        self.import_file(comments, 'comments', file_format)
+        post = Post.objects.get()
+        self.assertEqual(
+            (post.pk, post.text, post.pub_date, post.author, post.group),
+            (self.post.pk, self.post.text, self.post.pub_date,
+             self.author, self.group))
+        comment = Comment.objects.get()
+        self.assertEqual(
+            (comment.pk, comment.post, comment.author, comment.created),
+            (self.comment.pk, post, self.reader, self.comment.created))
+        post.author.stats.refresh_from_db()
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+    def test_ndjson_round_trip(self):
+        self.check_round_trip('ndjson')
+
+    def test_csv_round_trip(self):
+        self.check_round_trip('csv')
+
+    def test_unknown_author_skipped(self):
+        """Строки с неизвестным автором или группой пропускаются"""
+        path = os.path.join(self.directory.name, 'posts.ndjson')
+        with open(path, 'w') as file:
+            for author, group in (
+                    ('author', ''), ('nobody', ''), ('author', 'missing')):
+                file.write(json.dumps(
+                    {'text': 'Новый', 'author': author, 'group': group}))
+                file.write('\n')
+        out = StringIO()
+        call_command('import_posts', path, stdout=out)
+        self.assertIn('Загружено 1, пропущено 2', out.getvalue())
+        self.assertEqual(Post.objects.filter(text='Новый').count(), 1)
@@ -1,15 +1,23 @@
+import os
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.template.defaultfilters import filesizeformat
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Group, Post, User
+from posts.uploads import LimitedUploadHandler
 
 
 class PostCreateFormTests(TestCase):
@@ -137,3 +145,111 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(post_edit.text, 'Измененный пост')
         self.assertEqual(post_edit.image, 'posts/small_1.gif')
         self.assertEqual(post_edit.group, self.group2)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+class ImageUploadLimitsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, content, name='photo.jpg'):
+        return self.client.post(reverse('posts:create_post'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content, 'image/jpeg'),
+        })
+
+    def jpeg(self, size=(40, 20), **options):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', **options)
+        return buffer.getvalue()
+
+    def test_upload_streamed_to_temporary_file(self):
+        handler = LimitedUploadHandler()
+        handler.new_file('image', 'big.jpg', 'image/jpeg', None)
+        handler.receive_data_chunk(b'x' * 10, 0)
+        file = handler.file_complete(10)
+        self.assertTrue(file.temporary_file_path())
+        self.assertFalse(file.exceeded_limit)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_byte_limit(self):
+        """Байты сверх предела не пишутся, форма отклоняет файл"""
+        handler = LimitedUploadHandler()
+        handler.new_file('image', 'big.jpg', 'image/jpeg', None)
+        for start in range(0, 300, 100):
+            handler.receive_data_chunk(b'x' * 100, start)
+        file = handler.file_complete(300)
+        self.assertTrue(file.exceeded_limit)
+        self.assertEqual(os.path.getsize(file.temporary_file_path()), 100)
+        response = self.upload(self.jpeg())
+        self.assertFormError(
+            response, 'form', 'image', f'Файл больше {filesizeformat(100)}.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_views_use_limited_handler(self):
+        """Обработчик с пределом ставится только во view с картинками"""
+        self.assertNotIn(
+            'posts.uploads.LimitedUploadHandler',
+            settings.FILE_UPLOAD_HANDLERS)
+        with mock.patch.object(
+                LimitedUploadHandler, 'file_complete', autospec=True,
+                side_effect=LimitedUploadHandler.file_complete) as complete:
+            self.upload(self.jpeg())
+        complete.assert_called_once()
+
+    def test_csrf_checked(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        for url in (reverse('posts:create_post'),
+                    reverse('posts:post_edit', args=[0])):
+            with self.subTest(url=url):
+                response = client.post(url, {'text': 'Пост'})
+                self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=799)
+    def test_pixel_limit(self):
+        response = self.upload(self.jpeg())
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 799 пикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_metadata_stripped(self):
+        """EXIF удаляется, поворот из него применяется к пикселям"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        self.upload(self.jpeg(exif=exif.tobytes()))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertFalse(image.getexif())
+
+
+class CreatePostTransactionTests(TransactionTestCase):
+    def test_form_validated_outside_transaction(self):
+        """Проверка формы не держит блокировку записи"""
+        user = User.objects.create_user(username='auth')
+        client = Client()
+        client.force_login(user)
+        in_atomic = []
+        is_valid = PostForm.is_valid
+
+        def spy(form):
+            in_atomic.append(connection.in_atomic_block)
+            return is_valid(form)
+
+        with mock.patch.object(PostForm, 'is_valid', spy):
+            client.post(reverse('posts:create_post'), {'text': 'Пост'})
+        self.assertEqual(in_atomic, [False])
+        self.assertTrue(Post.objects.filter(text='Пост').exists())
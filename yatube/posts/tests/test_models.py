@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -34,3 +34,47 @@ class PostModelTest(TestCase):
             f"проверьте что __str__ метод модели {Group.__name__}"
             f"возвращает значение из поля 'title'"
         )
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_posts_count(self):
+        """Счётчик постов автора следует за созданием и удалением"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Пост 2')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_comments_count(self):
+        """Счётчик комментариев поста следует за комментариями"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counts(self):
+        """Подписка меняет счётчики подписчиков и подписок"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_counter_never_negative(self):
+        """Уменьшение разошедшегося счётчика не уходит ниже нуля"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
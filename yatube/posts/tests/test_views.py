@@ -1,14 +1,27 @@
 import shutil
 import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
 
-from posts.models import Follow, Group, Post, User
+from posts import follow_graph, follows, group_feed, thumbnails
+from posts.management.utils import auto_now_add_disabled
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.utils import encode_cursor
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -181,17 +194,71 @@ class PostsURLTests(TestCase):
         self.assertEqual(new_comment.text, form_data['text'])
 
     def test_cache_index(self):
-        """Тест кэширования главной страницы."""
+        """Главная кэшируется, пока посты не меняются."""
+        cache.clear()
         first = self.authorized_client.get(reverse('posts:index'))
-        post = Post.objects.get(pk=self.post.id)
-        post.text = 'Измененный текст'
-        post.save()
+        Post.objects.filter(pk=self.post.id).update(text='Измененный текст')
         second = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(first.content, second.content)
         cache.clear()
         third = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(first.content, third.content)
 
+    def test_cache_invalidated_on_post_change(self):
+        """Сохранение и удаление поста сбрасывают кэш лент."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', args=[self.userSecond]),
+        )
+        post = Post.objects.create(
+            text='Пост для кэша', author=self.userSecond, group=self.group)
+        for url in urls:
+            self.authorized_client.get(url)
+        post.text = 'Отредактированный пост для кэша'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, post.text)
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, post.text)
+
+    def test_cache_invalidated_on_group_rename(self):
+        """Новые название и slug группы видны во всех лентах с её постами."""
+        Follow.objects.create(user=self.user, author=self.userSecond)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.userSecond]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Переименованная группа'
+        group.slug = 'renamed'
+        group.save()
+        new_url = reverse('posts:group_list', args=['renamed'])
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.authorized_client.get(url), new_url)
+        self.assertContains(
+            self.authorized_client.get(urls[1]), 'Переименованная группа')
+
+    def test_cache_invalidated_on_group_move(self):
+        """Перенос поста в другую группу сбрасывает кэш обеих групп."""
+        group2 = Group.objects.create(title='Группа 2', slug='group-2')
+        old_url = reverse('posts:group_list', args=[self.group.slug])
+        self.authorized_client.get(old_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = group2
+        post.save()
+        response = self.authorized_client.get(old_url)
+        self.assertNotContains(response, post.text)
+
 
 class PaginatorViewsTest(TestCase):
     POSTS_PAGE = 3
@@ -243,8 +310,198 @@ class PaginatorViewsTest(TestCase):
                                      ), self.POSTS_PAGE)
 
 
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='Пост с комментариями', author=cls.author, group=cls.group)
+        cls.url = reverse('posts:post_detail', args=[cls.post.pk])
+
+    def add_comments(self, prefix, count):
+        commentators = [
+            User.objects.create_user(username=f'{prefix}_{i}')
+            for i in range(count)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=user, text='Комментарий')
+            for user in commentators
+        )
+
+    def test_queries_do_not_grow_with_comments(self):
+        """Число запросов post_detail не зависит от числа комментариев"""
+        self.add_comments('one', 1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        self.add_comments('many', 50)
+        with self.assertNumQueries(len(few.captured_queries)):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'many_49')
+
+    def test_missing_post_returns_404(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COMMENTS_ON_PAGE=3)
+class CommentsPaginationTest(TestCase):
+    COMMENTS_COUNT = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Коммент {i}')
+            for i in range(cls.COMMENTS_COUNT)
+        )
+        cls.expected = list(
+            cls.post.comments.order_by('-created', '-id').values_list(
+                'pk', flat=True)
+        )
+        cls.fragment_url = reverse('posts:post_comments', args=[cls.post.pk])
+
+    def test_post_detail_renders_first_chunk(self):
+        """Страница поста выводит только первую порцию комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual([c.pk for c in comments], self.expected[:3])
+        self.assertContains(response, comments.next_cursor)
+
+    def test_fragment_returns_next_chunk(self):
+        """Фрагмент по курсору отдаёт следующую порцию в HTML"""
+        first = self.client.get(self.fragment_url).context['comments']
+        response = self.client.get(
+            f'{self.fragment_url}?after={first.next_cursor}')
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual(
+            [c.pk for c in response.context['comments']], self.expected[3:])
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_fragment_json(self):
+        """Фрагмент отдаёт комментарии в JSON"""
+        data = self.client.get(self.fragment_url, {'format': 'json'}).json()
+        self.assertEqual(
+            [c['id'] for c in data['comments']], self.expected[:3])
+        data = self.client.get(
+            self.fragment_url, {'format': 'json', 'after': data['next']}
+        ).json()
+        self.assertEqual(
+            [c['id'] for c in data['comments']], self.expected[3:])
+        self.assertIsNone(data['next'])
+
+    def test_fragment_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PAGINATION_MODE='keyset')
+class KeysetPaginatorViewsTest(TestCase):
+    POSTS_COUNT = settings.POSTS_ON_PAGE * 2 + 3
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Заголовок для тестовой группы',
+            slug='test_slug',
+            description='Тестовое описание')
+        Post.objects.bulk_create(
+            [
+                Post(text=f'Тестовый пост {i}',
+                     author=cls.author,
+                     group=cls.group
+                     ) for i in range(cls.POSTS_COUNT)
+            ]
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.author}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_cover_feed(self):
+        """Переход по курсорам проходит всю ленту без повторов"""
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'pk', flat=True)
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                seen = []
+                query = ''
+                while True:
+                    page_obj = self.client.get(url + query).context[
+                        'page_obj']
+                    seen.extend(post.pk for post in page_obj)
+                    if not page_obj.has_next():
+                        break
+                    query = f'?after={page_obj.next_cursor}'
+                self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор назад возвращает предыдущую страницу"""
+        first = self.client.get(self.urls[0]).context['page_obj']
+        second = self.client.get(
+            f'{self.urls[0]}?after={first.next_cursor}').context['page_obj']
+        back = self.client.get(
+            f'{self.urls[0]}?before={second.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_last_page(self):
+        """Последняя страница содержит самые старые записи"""
+        page_obj = self.client.get(f'{self.urls[0]}?last=1').context[
+            'page_obj']
+        self.assertEqual(len(page_obj), settings.POSTS_ON_PAGE)
+        self.assertFalse(page_obj.has_next())
+        self.assertEqual(
+            page_obj[len(page_obj) - 1],
+            Post.objects.order_by('pub_date', 'id').first()
+        )
+
+    def test_no_count_query(self):
+        """Курсорная страница не выполняет COUNT"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.urls[0])
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(f'{self.urls[0]}?after=broken')
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_cursor_with_wrong_types_returns_first_page(self):
+        post = Post.objects.first()
+        comments = reverse('posts:post_comments', args=[post.pk])
+        for values in (
+            ['not-a-date', 1],
+            [{'a': 1}, 1],
+            [timezone.now().isoformat(), 'zz'],
+        ):
+            cursor = encode_cursor(values)
+            for url in (*self.urls, comments):
+                for param in ('after', 'before'):
+                    with self.subTest(values=values, url=url, param=param):
+                        response = self.client.get(url, {param: cursor})
+                        self.assertEqual(response.status_code, 200)
+
+
 class FollowTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client_auth_follower = Client()
         self.client_auth_following = Client()
         self.user_follower = User.objects.create(username='follower')
@@ -290,3 +547,609 @@ class FollowTests(TestCase):
     def test_folower_folowing(self):
         self.client_auth_following.get(self.follow)
         self.assertEqual(Follow.objects.all().count(), 0)
+
+    def test_profile_following_from_cache(self):
+        """Подписка на странице профиля берётся из кэша подписок"""
+        profile = reverse('posts:profile',
+                          args=[self.user_following.username])
+
+        def following():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client_auth_follower.get(profile)
+            follow_queries = [
+                query for query in queries
+                if 'posts_follow' in query['sql']
+            ]
+            return response.context['following'], len(follow_queries)
+
+        self.assertEqual(following(), (False, 1))
+        self.assertEqual(following(), (False, 0))
+        self.client_auth_follower.get(self.follow)
+        self.assertEqual(following(), (True, 1))
+        self.client_auth_follower.get(self.unfollow)
+        self.assertEqual(following(), (False, 1))
+
+    def test_is_following(self):
+        other = User.objects.create(username='other')
+        for author in (other, self.user_following):
+            Follow.objects.create(user=self.user_follower, author=author)
+        ids = follow_graph.following_ids(self.user_follower.pk)
+        self.assertEqual(
+            list(ids), sorted([other.pk, self.user_following.pk]))
+        self.assertTrue(follow_graph.is_following(
+            self.user_follower.pk, other.pk))
+        self.assertFalse(follow_graph.is_following(
+            self.user_following.pk, self.user_follower.pk))
+
+
+@override_settings(FOLLOW_TIMELINE=True, PAGINATION_MODE='keyset')
+class TimelineFollowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.follower = User.objects.create(username='follower')
+        self.author = User.objects.create(username='following')
+        self.old_post = Post.objects.create(
+            author=self.author,
+            text='Запись до подписки'
+        )
+        self.client.force_login(self.follower)
+        self.follow_index = reverse('posts:follow_index')
+
+    def feed(self):
+        return list(self.client.get(self.follow_index).context['page_obj'])
+
+    def test_follow_backfills_and_fans_out(self):
+        """Подписка заполняет ленту, новые посты раскладываются"""
+        self.client.get(reverse('posts:profile_follow',
+                                args=[self.author.username]))
+        self.assertEqual(self.feed(), [self.old_post])
+        new_post = Post.objects.create(author=self.author, text='Новая')
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower).count(), 2)
+
+    def test_unfollow_drops_entries(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.client.get(reverse('posts:profile_unfollow',
+                                args=[self.author.username]))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_author_read_on_demand(self):
+        """Посты популярного автора подмешиваются при чтении"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новая')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_authors_read_in_one_query(self):
+        """Популярные авторы подмешиваются одним запросом"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.feed()
+        with CaptureQueriesContext(connection) as single:
+            self.feed()
+        for i in range(3):
+            author = User.objects.create(username=f'heavy{i}')
+            Post.objects.create(author=author, text='Пост')
+            Follow.objects.create(user=self.follower, author=author)
+        self.feed()
+        with CaptureQueriesContext(connection) as many:
+            posts = self.feed()
+        self.assertEqual(len(many), len(single))
+        self.assertEqual(len(posts), 4)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_back_under_limit_is_fanned_out(self):
+        """refill_timelines раскладывает посты автора, переставшего
+        быть популярным"""
+        other = User.objects.create(username='other')
+        late = User.objects.create(username='late')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новая')
+        Follow.objects.create(user=late, author=self.author)
+        follows.unfollow_many(other, [self.author.pk])
+        Follow.objects.filter(user=late).delete()
+        self.assertEqual(self.feed(), [self.old_post])
+        with CaptureQueriesContext(connection) as queries:
+            call_command('refill_timelines', stdout=StringIO())
+        # Разложен только пост, написанный, пока автор был популярным
+        inserts = [query for query in queries
+                   if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower).count(), 2)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_refill_backfills_followers_from_heavy_time(self):
+        other = User.objects.create(username='other')
+        late = User.objects.create(username='late')
+        Follow.objects.create(user=other, author=self.author)
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=late, author=self.author)
+        Follow.objects.filter(user__in=[other, late]).delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists())
+        call_command('refill_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_rebuild_timelines(self):
+        """Команда rebuild_timelines восстанавливает ленты"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), [self.old_post])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailsTest(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(
+            author=self.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=self.small_gif,
+                content_type='image/gif'
+            ),
+        )
+
+    def image_src(self, url):
+        content = self.client.get(url).content.decode()
+        return content.split('class="card-img my-2" src="')[1].split('"')[0]
+
+    def test_generate_creates_all_variants(self):
+        """generate создаёт все ширины и форматы всех геометрий"""
+        thumbnails.generate(self.post.image.name, self.author.pk, None)
+        source = thumbnails.source_image(self.post.image.name)
+        for geometry in thumbnails.GEOMETRIES:
+            for *_, geometry_string, options in thumbnails.variants(
+                    geometry, source.width):
+                self.assertIsNotNone(thumbnails.backend.cached_thumbnail(
+                    self.post.image.name, geometry_string, **options))
+
+    def test_narrow_source_not_upscaled(self):
+        """Ширины больше исходной картинки не создаются"""
+        self.assertEqual(
+            [variant[1] for variant in thumbnails.variants('card', 2)],
+            [960])
+        self.assertEqual(
+            [variant[1] for variant in thumbnails.variants('card', 700)],
+            [320, 640, 960])
+
+    @override_settings(IMAGE_FORMATS=('NOPE', 'PNG', 'JPEG'))
+    def test_picture_markup(self):
+        """Лента отдаёт srcset и <source> для каждого доступного формата"""
+        self.assertEqual(thumbnails.image_formats(), ('PNG', 'JPEG'))
+        self.assertEqual(
+            [variant[:3] for variant in thumbnails.variants('card', 2000)],
+            [('PNG', 320, '320x113'), ('PNG', 640, '640x226'),
+             ('PNG', 960, '960x339'), ('JPEG', 320, '320x113'),
+             ('JPEG', 640, '640x226'), ('JPEG', 960, '960x339')])
+        buffer = BytesIO()
+        PILImage.new('RGB', (1000, 400)).save(buffer, 'JPEG')
+        post = Post.objects.create(
+            author=self.author,
+            text='Широкая картинка',
+            image=SimpleUploadedFile('wide.jpg', buffer.getvalue()),
+        )
+        thumbnails.generate(post.image.name, self.author.pk, None)
+        picture = thumbnails.picture(post, 'card')
+        self.assertEqual(picture['sources'][0][0], 'image/png')
+        self.assertIn('.png 320w', picture['sources'][0][1])
+        self.assertIn('.jpg 960w', picture['srcset'])
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(
+            response, f'srcset="{picture["srcset"]}" '
+                      f'sizes="(max-width: 960px) 100vw, 960px"')
+
+    def test_original_shown_until_thumbnail_ready(self):
+        """Пока миниатюры нет, лента показывает оригинал"""
+        url = reverse('posts:index')
+        self.assertEqual(self.image_src(url), self.post.image.url)
+        geometry_string, options = thumbnails.GEOMETRIES['card']
+        thumbnail = thumbnails.backend.cached_thumbnail(
+            self.post.image.name, geometry_string, **options)
+        self.assertEqual(self.image_src(url), thumbnail.url)
+
+    def test_detail_uses_detail_geometry(self):
+        """Страница поста показывает крупную миниатюру"""
+        thumbnails.generate(self.post.image.name, self.author.pk, None)
+        geometry_string, options = thumbnails.GEOMETRIES['detail']
+        thumbnail = thumbnails.backend.cached_thumbnail(
+            self.post.image.name, geometry_string, **options)
+        self.assertEqual(
+            self.image_src(
+                reverse('posts:post_detail', args=[self.post.pk])),
+            thumbnail.url)
+
+    def test_missing_image_falls_back_to_original(self):
+        """Пост с пропавшим файлом картинки отображается без ошибок"""
+        Post.objects.filter(pk=self.post.pk).update(image='posts/missing.gif')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '/media/posts/missing.gif')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.api_url = reverse('posts:api_search')
+
+    def found(self, **params):
+        response = self.client.get(self.api_url, params)
+        return [post['id'] for post in response.json()['results']]
+
+    def test_search_page(self):
+        post = Post.objects.create(author=self.author, text='Котики и собаки')
+        response = self.client.get(reverse('posts:search'), {'q': 'котик'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_empty_query(self):
+        Post.objects.create(author=self.author, text='Котики')
+        self.assertEqual(self.found(q=''), [])
+        self.assertEqual(self.found(q='"*'), [])
+
+    def test_relevance_and_recency(self):
+        """Релевантные и свежие посты выше"""
+        rare = Post.objects.create(author=self.author, text='котики')
+        frequent = Post.objects.create(
+            author=self.author, text='котики котики котики')
+        old = Post.objects.create(
+            author=self.author, text='котики котики котики')
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timedelta(days=365))
+        self.assertEqual(
+            self.found(q='котики'), [frequent.pk, rare.pk, old.pk])
+
+    def test_filters(self):
+        in_group = Post.objects.create(
+            author=self.author, group=self.group, text='котики')
+        by_other = Post.objects.create(author=self.other, text='котики')
+        self.assertEqual(self.found(q='котики', group='group'), [in_group.pk])
+        self.assertEqual(self.found(q='котики', author='other'), [by_other.pk])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении постов"""
+        post = Post.objects.create(author=self.author, text='котики')
+        post.text = 'собаки'
+        post.save()
+        self.assertEqual(self.found(q='котики'), [])
+        self.assertEqual(self.found(q='собаки'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found(q='собаки'), [])
+
+    def test_cursor_pagination(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'котики {i}')
+            for i in range(settings.POSTS_ON_PAGE + 2)
+        )
+        first = self.client.get(self.api_url, {'q': 'котики'}).json()
+        second = self.client.get(self.api_url, {
+            'q': 'котики', 'after': first['next'], 'at': first['at'],
+        }).json()
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(len(first['results']), settings.POSTS_ON_PAGE)
+        self.assertIsNone(second['next'])
+        self.assertCountEqual(
+            ids, Post.objects.values_list('pk', flat=True))
+
+    def test_fallback_without_index(self):
+        post = Post.objects.create(author=self.author, text='котики')
+        with mock.patch('posts.search.has_index', return_value=False):
+            self.assertEqual(self.found(q='котики'), [post.pk])
+
+
+class ConditionalFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.author.username]),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_not_modified(self):
+        """Неизменившаяся лента отдаёт 304, новый пост — 200"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост')
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_anonymous_cache_headers(self):
+        response = self.client.get(self.urls[0])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn(
+            f'max-age={settings.FEED_CACHE_MAX_AGE}',
+            response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_user_responses_are_private(self):
+        """Ответ пользователю приватный и со своим ETag"""
+        response = self.reader_client.get(self.urls[0])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(
+            response['ETag'], self.client.get(self.urls[0])['ETag'])
+
+    def test_follow_changes_profile_etag(self):
+        url = self.urls[2]
+        etag = self.reader_client.get(url)['ETag']
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['following'])
+
+    def test_other_follows_change_profile_etag(self):
+        """Чужая подписка меняет счётчик подписчиков в профиле"""
+        url = self.urls[2]
+        etag = self.client.get(url)['ETag']
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Подписчиков: 1')
+
+    def test_edit_is_not_hidden_by_if_modified_since(self):
+        """Правка поста не отдаёт устаревший 304"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotIn('Last-Modified', self.client.get(url))
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        post = Post.objects.get(author=self.author)
+        post.text = 'Исправленный пост'
+        post.save()
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag),
+                    'Исправленный пост')
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_repeat_served_from_cache(self):
+        """Повторный анонимный запрос не рендерит шаблон"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.client.get(url).context)
+                response = self.client.get(url)
+                self.assertIsNone(response.context)
+                self.assertContains(response, 'Тестовый пост')
+
+    def test_query_string_is_part_of_key(self):
+        self.client.get(self.urls[0])
+        self.assertIsNotNone(self.client.get(f'{self.urls[0]}?page=1').context)
+
+    def test_invalidated_by_signals(self):
+        """Новый пост и правка группы сбрасывают страницы"""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост')
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Новый пост')
+        self.group.title = 'Переименованная группа'
+        self.group.save()
+        self.assertContains(
+            self.client.get(self.urls[1]), 'Переименованная группа')
+
+    def test_authenticated_bypass(self):
+        """Пользователь видит свою шапку, аноним — никогда"""
+        self.client.get(self.urls[0])
+        response = self.author_client.get(self.urls[0])
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'Новая запись')
+        self.assertNotContains(self.client.get(self.urls[0]), 'Новая запись')
+
+
+class FeedVersionCommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='auth')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.urls = (
+            (self.client, reverse('posts:index')),
+            (self.reader_client, reverse('posts:index')),
+            (self.reader_client, reverse('posts:follow_index')),
+            (self.client, reverse('posts:profile', args=['auth'])),
+        )
+
+    def read_in_thread(self):
+        """Запросы из другого соединения, пока транзакция не закрыта"""
+        def read():
+            try:
+                for client, url in self.urls:
+                    client.get(url)
+            finally:
+                connections.close_all()
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join()
+
+    def test_reader_during_transaction(self):
+        """Страница, прочитанная до фиксации, не остаётся в кэше"""
+        with transaction.atomic():
+            Post.objects.create(author=self.author, text='Новый пост')
+            self.read_in_thread()
+        for client, url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), 'Новый пост')
+
+    def test_follow_during_transaction(self):
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Пост другого автора')
+        with transaction.atomic():
+            Follow.objects.create(user=self.reader, author=other)
+            self.read_in_thread()
+        self.assertContains(
+            self.reader_client.get(reverse('posts:follow_index')),
+            'Пост другого автора')
+
+
+@override_settings(GROUP_FEED_PAGES=1)
+class GroupFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other = Group.objects.create(title='Другая', slug='other')
+        start = timezone.now() - timedelta(days=1)
+        with auto_now_add_disabled(Post, 'pub_date'):
+            cls.posts = [
+                Post.objects.create(
+                    author=cls.author, group=cls.group, text=f'Пост {i}',
+                    pub_date=start + timedelta(minutes=i))
+                for i in range(settings.POSTS_ON_PAGE + 5)
+            ]
+        cls.url = reverse('posts:group_list', args=[cls.group.slug])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def page(self, **params):
+        return list(self.client.get(self.url, params).context['page_obj'])
+
+    def expected(self):
+        return list(self.group.posts.order_by('-pub_date', '-id'))
+
+    def test_pages_from_cache(self):
+        """Повторный запрос не ищет группу и не считает посты"""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            first = self.page()
+        # Кроме сессии и пользователя — только выборка постов по id
+        posts_queries = [
+            query['sql'] for query in queries if '"posts_' in query['sql']]
+        self.assertEqual(len(posts_queries), 1)
+        self.assertIn('IN (', posts_queries[0])
+        with CaptureQueriesContext(connection) as queries:
+            pages = self.page(page=1) + self.page(page=2)
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('"posts_group"', sql)
+        self.assertEqual(first, self.expected()[:settings.POSTS_ON_PAGE])
+        self.assertEqual(pages, self.expected())
+
+    def test_keyset_pages(self):
+        page = self.client.get(self.url).context['page_obj']
+        rows = list(page)
+        while page.has_next():
+            page = self.client.get(
+                self.url, {'after': page.next_cursor}).context['page_obj']
+            rows += page
+        self.assertEqual(rows, self.expected())
+
+    def test_dropped_on_change(self):
+        """Сигналы Post сбрасывают запись, следующий запрос её заполняет"""
+        self.page()
+        new = Post.objects.create(
+            author=self.author, group=self.group, text='Новый')
+        self.assertIsNone(cache.get(group_feed.feed_key(self.group.pk)))
+        self.page()
+        self.posts[-1].group = self.other
+        self.posts[-1].save()
+        self.assertIsNone(cache.get(group_feed.feed_key(self.group.pk)))
+        self.page()
+        self.posts[-2].delete()
+        self.assertIsNone(cache.get(group_feed.feed_key(self.group.pk)))
+        entry = group_feed.get_entry(self.group.pk)
+        self.assertEqual(entry.total, len(self.posts) - 1)
+        self.assertEqual(self.page()[:2], [new, self.posts[-3]])
+        self.assertEqual(
+            self.page(page=1) + self.page(page=2), self.expected())
+
+    def test_refill_does_not_count_posts(self):
+        """Число постов группы меняют сигналы, заполнение его не считает"""
+        self.page()
+        moved, deleted = self.expected()[:2]
+        new = Post.objects.create(
+            author=self.author, group=self.group, text='Новый')
+        moved.group = self.other
+        moved.save()
+        deleted.delete()
+        with CaptureQueriesContext(connection) as queries:
+            page = self.page()
+        self.assertNotIn(
+            'COUNT(', ' '.join(query['sql'] for query in queries))
+        self.assertEqual(page[0], new)
+        self.assertEqual(
+            group_feed.get_entry(self.group.pk).total, len(self.posts) - 1)
+
+    def test_stale_entry_falls_back_to_database(self):
+        self.page()
+        Post.objects.filter(pk=self.posts[-1].pk).update(group=self.other)
+        self.assertEqual(
+            self.page(), self.expected()[:settings.POSTS_ON_PAGE])
+        self.assertIsNone(cache.get(group_feed.feed_key(self.group.pk)))
+
+    def test_unknown_group(self):
+        response = self.client.get(
+            reverse('posts:group_list', args=['missing']))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,205 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+После сохранения поста с картинкой все миниатюры из GEOMETRIES
+генерируются в пуле потоков, а не в запросе первого читателя.
+Каждая геометрия кодируется в нескольких ширинах из IMAGE_WIDTHS
+и во всех форматах из IMAGE_FORMATS, которые умеют Pillow и sorl;
+шаблон отдаёт их через srcset и <picture>. Пока каких-то вариантов
+нет, шаблон показывает оригинал картинки.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('960x960', {'crop': 'center', 'upscale': True}),
+}
+
+# Формат для <img>, его понимают все браузеры
+FALLBACK_FORMAT = 'JPEG'
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class PreviewBackend(ThumbnailBackend):
+    def cached_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра из kvstore или None, без генерации."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = PreviewBackend()
+
+
+def image_formats():
+    """Форматы из IMAGE_FORMATS, которые можно закодировать, и запасной."""
+    Image.init()
+    formats = [
+        image_format for image_format in settings.IMAGE_FORMATS
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+        and image_format != FALLBACK_FORMAT
+    ]
+    return (*formats, FALLBACK_FORMAT)
+
+
+def variants(geometry, source_width):
+    """(формат, ширина, геометрия, опции) вариантов геометрии.
+
+    Ширины из IMAGE_WIDTHS больше исходной картинки пропускаются:
+    растянутый вариант только тратит трафик. Полная ширина геометрии
+    есть всегда. Высота узких вариантов пропорциональна.
+    """
+    geometry_string, options = GEOMETRIES[geometry]
+    full_width, full_height = map(int, geometry_string.split('x'))
+    widths = sorted({
+        width for width in settings.IMAGE_WIDTHS
+        if width < full_width and width <= source_width
+    } | {full_width})
+    return [
+        (
+            image_format,
+            width,
+            f'{width}x{round(full_height * width / full_width)}',
+            {**options, 'format': image_format},
+        )
+        for image_format in image_formats()
+        for width in widths
+    ]
+
+
+def source_image(name):
+    """Исходная картинка из kvstore (с размерами) или None."""
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def picture(post, geometry):
+    """Данные для разметки <picture> картинки поста.
+
+    src — самый широкий вариант запасного формата, srcset — все его
+    ширины, sources — (MIME-тип, srcset) остальных форматов. Если
+    каких-то вариантов ещё нет, ставит генерацию в очередь и отдаёт
+    только оригинал.
+    """
+    if not post.image:
+        return None
+    source = source_image(post.image.name)
+    srcsets = {}
+    for image_format, width, geometry_string, options in (
+            variants(geometry, source.width) if source else ()):
+        thumbnail = backend.cached_thumbnail(
+            post.image.name, geometry_string, **options)
+        if thumbnail is None:
+            srcsets = {}
+            break
+        srcsets.setdefault(image_format, []).append(
+            f'{thumbnail.url} {width}w')
+        # Запасной формат последний, ширины по возрастанию
+        src = thumbnail.url
+    if not srcsets:
+        submit(post.image.name, post.author_id, post.group_id)
+        return {'src': post.image.url, 'srcset': '', 'sources': []}
+    full_width = int(GEOMETRIES[geometry][0].split('x')[0])
+    return {
+        'src': src,
+        'srcset': ', '.join(srcsets.pop(FALLBACK_FORMAT)),
+        'sizes': f'(max-width: {full_width}px) 100vw, {full_width}px',
+        'sources': [
+            (Image.MIME[image_format], ', '.join(srcset))
+            for image_format, srcset in srcsets.items()
+        ],
+    }
+
+
+def thumbnail_url(post, geometry):
+    """URL самой широкой миниатюры или оригинала, пока её нет."""
+    if not post.image:
+        return ''
+    return picture(post, geometry)['src']
+
+
+def generate(name, author_id, group_id):
+    """Создаёт недостающие миниатюры картинки name."""
+    try:
+        if not default.storage.exists(name):
+            return
+        source = default.kvstore.get_or_set(ImageFile(name, default.storage))
+        created = False
+        for geometry in GEOMETRIES:
+            for *_, geometry_string, options in variants(
+                    geometry, source.width):
+                if backend.cached_thumbnail(
+                        name, geometry_string, **options) is None:
+                    backend.get_thumbnail(name, geometry_string, **options)
+                    created = True
+        if created:
+            # Фрагменты лент закэшированы со ссылкой на оригинал
+            cache.bump_post_feeds(author_id, group_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+
+
+def _run(name, author_id, group_id):
+    try:
+        generate(name, author_id, group_id)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        connections.close_all()
+
+
+def _enqueue(name, author_id, group_id):
+    global _executor
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    _executor.submit(_run, name, author_id, group_id)
+
+
+def submit(name, author_id, group_id):
+    """Ставит генерацию миниатюр в очередь пула.
+
+    Задача уходит в пул после фиксации текущей транзакции, чтобы поток
+    не читал незафиксированные данные. При THUMBNAIL_WORKERS = 0
+    миниатюры создаются сразу.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name, author_id, group_id)
+        return
+    transaction.on_commit(lambda: _enqueue(name, author_id, group_id))
+
+
+def schedule(post):
+    """Генерирует миниатюры сохранённой картинки поста."""
+    if post.image:
+        submit(post.image.name, post.author_id, post.group_id)
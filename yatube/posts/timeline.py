@@ -0,0 +1,185 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост автора раскладывается по лентам подписчиков в TimelineEntry,
+а страница /follow/ читается одним проходом по индексу
+(user, pub_date, post). Посты авторов, у которых подписчиков больше
+TIMELINE_FANOUT_LIMIT, не раскладываются — они подмешиваются в ленту
+при чтении (fan-out on read). Когда подписчиков снова не больше
+предела, пропущенное раскладывает команда refill_timelines.
+"""
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+
+from .follow_graph import following_ids
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .utils import get_page_obj, use_keyset
+
+FEED_KEYS = ('feed_date', 'feed_post')
+
+BATCH_SIZE = 500
+
+# Больше авторов не перечисляем в IN, а проверяем подписку в EXISTS
+MAX_IN_AUTHORS = 500
+
+
+def heavy_author_ids(user):
+    """Авторы из подписок user, чьи посты читаются без раскладки."""
+    ids = following_ids(user.pk)
+    if not ids:
+        return []
+    if len(ids) > MAX_IN_AUTHORS:
+        return Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).values_list('author_id', flat=True)
+    return AuthorStats.objects.filter(
+        user_id__in=ids,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('user_id', flat=True)
+
+
+def is_heavy(author_id):
+    return AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).exists()
+
+
+def following_posts(user):
+    """Посты авторов из подписок user без материализованной ленты.
+
+    Авторы берутся из кэша подписок; если их много, подписка
+    проверяется в EXISTS. В обоих случаях запрос идёт по индексу
+    pub_date без JOIN и сортировки.
+    """
+    ids = following_ids(user.pk)
+    if len(ids) <= MAX_IN_AUTHORS:
+        return Post.objects.filter(
+            author_id__in=ids.tolist()).select_related('author', 'group')
+    follows = Follow.objects.filter(user=user, author=OuterRef('author'))
+    return Post.objects.annotate(
+        followed=Exists(follows)
+    ).filter(followed=True).select_related('author', 'group')
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_heavy(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            ) for user_id in followers
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту user все посты автора после подписки."""
+    backfill_many(user_id, [author_id])
+
+
+def backfill_many(user_id, author_ids):
+    """backfill сразу для нескольких авторов, без популярных."""
+    heavy = AuthorStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('user_id', flat=True)
+    author_ids = set(author_ids) - set(heavy)
+    if not author_ids:
+        return
+    posts = Post.objects.filter(author_id__in=author_ids).values_list(
+        'pk', 'author_id', 'pub_date').order_by()
+    batch = []
+    for post_id, author_id, pub_date in posts.iterator(
+            chunk_size=BATCH_SIZE):
+        batch.append(TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        ))
+        if len(batch) == BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def refill_light():
+    """Раскладывает пропущенное, пока авторы были популярными.
+
+    Посты без единой записи в лентах созданы, когда у автора было
+    больше TIMELINE_FANOUT_LIMIT подписчиков, — они раскладываются
+    по лентам. Подписчикам без единой записи автора, подписавшимся
+    в то же время, лента автора заполняется целиком. Остальное уже
+    разложено, поэтому работа не зависит от всей истории автора.
+    """
+    light = AuthorStats.objects.filter(
+        user_id=OuterRef('author_id'),
+        followers_count__lte=settings.TIMELINE_FANOUT_LIMIT,
+    )
+    entries = TimelineEntry.objects.filter(
+        user_id=OuterRef('user_id'), author_id=OuterRef('author_id'))
+    follows = Follow.objects.annotate(
+        light=Exists(light), filled=Exists(entries),
+    ).filter(light=True, filled=False).values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator(chunk_size=BATCH_SIZE):
+        backfill(user_id, author_id)
+    followed = Follow.objects.filter(author_id=OuterRef('author_id'))
+    posts = Post.objects.annotate(
+        light=Exists(light),
+        followed=Exists(followed),
+        fanned_out=Exists(
+            TimelineEntry.objects.filter(post_id=OuterRef('pk'))),
+    ).filter(light=True, followed=True, fanned_out=False).only(
+        'pk', 'author_id', 'pub_date').order_by()
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        fan_out(post)
+
+
+def drop(user_id, *author_ids):
+    """Убирает из ленты user посты авторов после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids).delete()
+
+
+def rebuild():
+    """Пересобирает все ленты по текущим подпискам."""
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.values_list('user_id', 'author_id').order_by()
+    for user_id, author_id in follows.iterator(chunk_size=BATCH_SIZE):
+        backfill(user_id, author_id)
+
+
+def follow_feed(user):
+    """Лента подписок с ключами FEED_KEYS: записи TimelineEntry
+    и список из одного queryset постов всех популярных авторов."""
+    entries = Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_post=F('timeline_entries__post_id'),
+    )
+    heavy = []
+    author_ids = list(heavy_author_ids(user))
+    if author_ids:
+        heavy.append(Post.objects.filter(author_id__in=author_ids).annotate(
+            feed_date=F('pub_date'),
+            feed_post=F('id'),
+        ).select_related('author', 'group'))
+    return entries.select_related('author', 'group'), heavy
+
+
+def get_follow_page_obj(request, user):
+    """Страница ленты подписок user."""
+    if not use_keyset(request):
+        return get_page_obj(request, following_posts(user))
+    entries, heavy = follow_feed(user)
+    return get_page_obj(
+        request, entries, keys=FEED_KEYS, merge_with=heavy)
@@ -0,0 +1,66 @@
+"""Построчное чтение и запись постов и комментариев в NDJSON и CSV.
+
+Используется командами import_posts и export_posts: строки читаются
+и пишутся по одной, поэтому память не зависит от объёма выгрузки.
+"""
+import csv
+import json
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+FIELDS = {
+    'posts': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+}
+
+FORMATS = ('ndjson', 'csv')
+
+
+def read_rows(file, file_format):
+    """Словари строк из файла."""
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+class RowWriter:
+    def __init__(self, file, file_format, fields):
+        self.file = file
+        self.fields = fields
+        self.csv = None
+        if file_format == 'csv':
+            self.csv = csv.writer(file)
+            self.csv.writerow(fields)
+
+    def write(self, values):
+        if self.csv is not None:
+            self.csv.writerow(
+                '' if value is None else value for value in values)
+            return
+        self.file.write(json.dumps(
+            dict(zip(self.fields, values)), ensure_ascii=False))
+        self.file.write('\n')
+
+
+def parse_date(value):
+    """Дата из строки ISO 8601, без зоны — UTC; пустая — сейчас."""
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def format_date(value):
+    return value.isoformat() if value else None
+
+
+def parse_id(value):
+    return int(value) if value not in (None, '') else None
@@ -0,0 +1,90 @@
+"""Приём картинок постов с ограниченным расходом памяти.
+
+LimitedUploadHandler пишет загрузку во временный файл кусками, поэтому
+в памяти не бывает больше одного куска. Он ставится только во view
+с картинками через limited_uploads. Байты сверх
+IMAGE_UPLOAD_MAX_BYTES не записываются, а форма отклоняет такой файл.
+Размеры картинки проверяются по заголовку без декодирования, так что
+до полного декодирования при перекодировании доходят только картинки
+не больше IMAGE_UPLOAD_MAX_PIXELS.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+# Остальные форматы (GIF с анимацией и т. п.) сохраняются как есть
+REENCODE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Временный файл не больше IMAGE_UPLOAD_MAX_BYTES.
+
+    Остаток большого файла дочитывается из запроса и отбрасывается,
+    у файла выставляется exceeded_limit.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.exceeded_limit = file_size > settings.IMAGE_UPLOAD_MAX_BYTES
+        return file
+
+
+def limited_uploads(view):
+    """Загрузки view принимает LimitedUploadHandler.
+
+    Обработчики меняются только до чтения POST, а его читает
+    CsrfViewMiddleware, поэтому CSRF проверяется уже внутри.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [LimitedUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def strip_metadata(upload):
+    """Перекодирует картинку на месте без EXIF, XMP и текстовых блоков.
+
+    Поворот из EXIF применяется к пикселям, цветовой профиль
+    сохраняется. Форматы не из REENCODE_OPTIONS не трогаются.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image_format = image.format
+        if image_format not in REENCODE_OPTIONS:
+            upload.seek(0)
+            return upload
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    options = dict(REENCODE_OPTIONS[image_format])
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    # Картинка уже целиком в памяти, исходный файл можно перезаписать
+    upload.seek(0)
+    upload.truncate()
+    image.save(upload, image_format, **options)
+    upload.size = upload.tell()
+    upload.content_type = Image.MIME[image_format]
+    upload.seek(0)
+    return upload
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 
 app_name = 'posts'
@@ -10,6 +10,32 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('search/', views.search, name='search'),
+    path('api/search/', views.api_search, name='api_search'),
+    path('api/posts/', api.index, name='api_index'),
+    path(
+        'api/posts/<int:post_id>/',
+        api.post_detail,
+        name='api_post_detail'
+    ),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group'),
+    path(
+        'api/profile/<str:username>/',
+        api.profile,
+        name='api_profile'
+    ),
+    path('api/follow/', api.follow_index, name='api_follow'),
+    path('api/follow/bulk/', api.follow_bulk, name='api_follow_bulk'),
+    path(
+        'api/follow/suggestions/',
+        api.follow_suggestions,
+        name='api_follow_suggestions'
+    ),
     path('create/', views.create_post, name='create_post'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -1,9 +1,177 @@
+import base64
+import binascii
+import json
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment
+
+
+def encode_cursor(values):
+    """Кодирует значения ключа в строку для URL."""
+    raw = json.dumps(
+        [value.isoformat() if hasattr(value, 'isoformat') else value
+         for value in values]
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Раскодирует курсор, None — если курсор повреждён."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode())
+        if not isinstance(values, list) or len(values) != 2:
+            return None
+        return [
+            parse_datetime(value) or value if isinstance(value, str)
+            else value
+            for value in values
+        ]
+    except (binascii.Error, ValueError):
+        return None
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id) без COUNT и OFFSET.
+
+    Номер страницы условный: 1 — начало ленты, 2 — любая страница
+    после неё. Переходы выполняются по курсорам next_cursor
+    и previous_cursor, которые выставляются странице.
+
+    merge_with — дополнительные querysets с теми же ключами, их строки
+    сливаются с основной выборкой (дубликаты по ключу отбрасываются).
+    Вместо queryset можно передать объект с keyset_slice(cursor,
+    forward, limit) и queryset, как posts.group_feed.GroupFeed: если
+    keyset_slice вернул None, строки берутся из его queryset.
+    """
+    keyset = True
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 merge_with=(), **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.keys = keys
+        self.merge_with = tuple(merge_with)
+        self._number = 1
+        self._has_next = False
+
+    @property
+    def num_pages(self):
+        return self._number + int(self._has_next)
 
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
 
-def get_page_obj(request, queryset, post_on_page=settings.POSTS_ON_PAGE):
+    def key_fields(self):
+        """Поля ключей: поля модели или output_field аннотаций."""
+        queryset = getattr(self.object_list, 'queryset', self.object_list)
+        fields = []
+        for key in self.keys:
+            annotation = queryset.query.annotations.get(key)
+            if annotation is not None:
+                fields.append(annotation.output_field)
+            else:
+                fields.append(queryset.model._meta.get_field(key))
+        return fields
+
+    def decode(self, token):
+        """Курсор с значениями типов ключей, None — если он не подходит."""
+        values = token and decode_cursor(token)
+        if not values:
+            return None
+        try:
+            values = [field.to_python(value)
+                      for field, value in zip(self.key_fields(), values)]
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if None in values:
+            return None
+        return values
+
+    def _slice(self, queryset, cursor, forward):
+        keyset_slice = getattr(queryset, 'keyset_slice', None)
+        if keyset_slice is not None:
+            rows = keyset_slice(cursor, forward, self.per_page + 1)
+            if rows is not None:
+                return rows
+            queryset = queryset.queryset
+        first, second = self.keys
+        if cursor is not None:
+            lookup = 'lt' if forward else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{first}__{lookup}': cursor[0]})
+                | Q(**{first: cursor[0], f'{second}__{lookup}': cursor[1]})
+            )
+        prefix = '-' if forward else ''
+        queryset = queryset.order_by(prefix + first, prefix + second)
+        return list(queryset[:self.per_page + 1])
+
+    def _seek(self, cursor, forward):
+        rows = self._slice(self.object_list, cursor, forward)
+        if self.merge_with:
+            merged = {self.key_for(row): row for row in rows}
+            for queryset in self.merge_with:
+                for row in self._slice(queryset, cursor, forward):
+                    merged.setdefault(self.key_for(row), row)
+            rows = [merged[key] for key in sorted(merged, reverse=forward)]
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def get_cursor_page(self, after=None, before=None, last=False):
+        after = self.decode(after)
+        before = self.decode(before)
+        if before or last:
+            rows, has_previous = self._seek(before or None, forward=False)
+            rows.reverse()
+            has_next = bool(before)
+        else:
+            rows, has_next = self._seek(after or None, forward=True)
+            has_previous = bool(after)
+        self._number = 2 if has_previous else 1
+        self._has_next = has_next
+        page = Page(rows, self._number, self)
+        page.next_cursor = page.previous_cursor = None
+        if rows:
+            page.next_cursor = self.cursor_for(rows[-1])
+            page.previous_cursor = self.cursor_for(rows[0])
+        return page
+
+    def key_for(self, obj):
+        if isinstance(obj, dict):
+            return tuple(obj[key] for key in self.keys)
+        return tuple(getattr(obj, key) for key in self.keys)
+
+    def cursor_for(self, obj):
+        return encode_cursor(self.key_for(obj))
+
+
+def use_keyset(request):
+    return settings.PAGINATION_MODE == 'keyset' and 'page' not in request.GET
+
+
+def get_page_obj(request, queryset, post_on_page=settings.POSTS_ON_PAGE,
+                 **keyset_options):
+    if use_keyset(request):
+        paginator = KeysetPaginator(queryset, post_on_page, **keyset_options)
+        return paginator.get_cursor_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            last='last' in request.GET,
+        )
     paginator = Paginator(queryset, post_on_page)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def get_comments_page(request, post_id):
+    """Страница комментариев поста по курсору (created, id)."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    paginator = KeysetPaginator(
+        comments, settings.COMMENTS_ON_PAGE, keys=('created', 'id'))
+    return paginator.get_cursor_page(after=request.GET.get('after'))
@@ -1,35 +1,59 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.views.decorators.http import condition
 
-from .forms import PostForm, CommentForm
-from .models import Comment, Group, Post, Follow, User
-from .utils import get_page_obj
-
+from core.replicas import replica_reads
 
+from . import follow_graph, group_feed, thumbnails
+from .conditional import feed_cache_headers, feed_etag
+from .forms import PostForm, CommentForm
+from .models import Post, Follow, User
+from .page_cache import anonymous_page_cache
+from .search import get_search_page, next_query
+from .timeline import following_posts, get_follow_page_obj
+from .uploads import limited_uploads
+from .utils import get_comments_page, get_page_obj
+
+
+@replica_reads
+@feed_cache_headers
+@condition(feed_etag('index', per_user=True))
+@anonymous_page_cache('index')
 def index(request):
     posts = Post.objects.select_related('author', 'group')
     page_obj = get_page_obj(request, posts)
     return render(request, 'posts/index.html', {'page_obj': page_obj})
 
 
+@replica_reads
+@feed_cache_headers
+@condition(feed_etag('group', per_user=True))
+@anonymous_page_cache('group')
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
-    page_obj = get_page_obj(request, posts)
+    group = group_feed.get_group(slug)
+    if group is None:
+        raise Http404
+    page_obj = get_page_obj(request, group_feed.GroupFeed(group.pk))
     return render(request, 'posts/group_list.html', {
         'group': group,
         'page_obj': page_obj,
     })
 
 
+@replica_reads
+@feed_cache_headers
+@condition(feed_etag('profile', per_user=True))
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     posts_user = user.posts.select_related('group')
     page_obj = get_page_obj(request, posts_user)
     following = (request.user.is_authenticated
-                 and user.following.filter(
-                     author=user, user=request.user).exists())
+                 and follow_graph.is_following(request.user.pk, user.pk))
     return render(request, 'posts/profile.html', {
         'author': user,
         'page_obj': page_obj,
@@ -37,29 +61,90 @@ def profile(request, username):
     })
 
 
+@replica_reads
 def post_detail(request, post_id):
-    post = Post.objects.get(id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
     form = CommentForm(request.POST or None)
-    comment = Comment.objects.filter(post=post)
     return render(request, 'posts/post_detail.html', {
         'post': post,
         'form': form,
-        'comments': comment,
+        'comments': get_comments_page(request, post.pk),
+    })
+
+
+@replica_reads
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = get_comments_page(request, post.pk)
+    if request.GET.get('format') != 'json':
+        return render(request, 'includes/comments.html', {
+            'post': post,
+            'comments': comments,
+        })
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'author_name': comment.author.get_full_name(),
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            } for comment in comments
+        ],
+        'next': comments.next_cursor if comments.has_next() else None,
+    })
+
+
+def search(request):
+    page_obj = get_search_page(request)
+    return render(request, 'posts/search.html', {
+        'page_obj': page_obj,
+        'query': request.GET.get('q', ''),
+        'group': request.GET.get('group', ''),
+        'author': request.GET.get('author', ''),
+        'next_query': next_query(request, page_obj),
+    })
+
+
+def api_search(request):
+    page_obj = get_search_page(request)
+    return JsonResponse({
+        'results': [
+            {
+                'id': post.pk,
+                'text': post.text,
+                'author': post.author.username,
+                'group': post.group.slug if post.group else None,
+                'pub_date': post.pub_date.isoformat(),
+                'score': post.score,
+            } for post in page_obj
+        ],
+        'next': page_obj.next_cursor if page_obj.has_next() else None,
+        'at': page_obj.reference.isoformat(),
     })
 
 
 @login_required
+@limited_uploads
 def create_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
+    # Картинка проверяется до транзакции: BEGIN IMMEDIATE держит
+    # блокировку записи до конца транзакции
     if form.is_valid():
-        post = form.save(commit=False)
-        post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post = form.save(commit=False)
+            post.author = request.user
+            post.save()
+            thumbnails.schedule(post)
         return redirect(reverse('posts:profile', args=[request.user]))
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@limited_uploads
 def post_edit(request, post_id):
     post = Post.objects.get(pk=post_id)
     if post.author != request.user:
@@ -71,6 +156,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
     return render(request, 'posts/create_post.html', {
         'post': post,
@@ -83,23 +170,28 @@ def add_comment(request, post_id):
     post = Post.objects.get(pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment = form.save(commit=False)
+            comment.author = request.user
+            comment.post = post
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@replica_reads
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page_obj(request, post_list)
+    if settings.FOLLOW_TIMELINE:
+        page_obj = get_follow_page_obj(request, request.user)
+    else:
+        page_obj = get_page_obj(request, following_posts(request.user))
     return render(request, 'posts/follow.html', {
         'page_obj': page_obj,
     })
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -108,6 +200,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
@@ -52,6 +52,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -87,6 +90,19 @@ TEMPLATES = [
     },
 ]
 
+if not DEBUG:
+    # Скомпилированные шаблоны живут в памяти процесса, постоянные
+    # include встроены в текст шаблона.
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            ('core.template_loaders.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ]),
+    ]
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -95,11 +111,35 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # WAL, прагмы, BEGIN IMMEDIATE и очередь пишущих транзакций
+        'ENGINE': 'core.db_backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        # Тестовая база в файле: база в памяти с общим кэшем отвечает
+        # «table is locked» без ожидания, а миниатюры пишутся из потоков
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
     }
 }
 
+# Реплики только для чтения, см. core.replicas. Для локальной проверки
+# подойдёт копия базы: cp db.sqlite3 db.replica.sqlite3
+# и DATABASE_REPLICAS = ['replica']
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+    'TEST': {'MIRROR': 'default'},
+}
+
+DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает с default
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -143,6 +183,78 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 POSTS_ON_PAGE = 10
 
+COMMENTS_ON_PAGE = 20
+
+# 'keyset' — курсорная пагинация лент, 'offset' — постраничная
+PAGINATION_MODE = 'keyset'
+
+# Материализованная лента подписок. Перед включением выполните
+# manage.py rebuild_timelines.
+FOLLOW_TIMELINE = False
+
+# Посты авторов с большим числом подписчиков читаются без раскладки.
+# Когда подписчиков становится меньше, их посты раскладывает
+# manage.py refill_timelines — запускайте её по расписанию.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# За столько дней релевантность поста в поиске падает вдвое
+SEARCH_RECENCY_DAYS = 30
+
+# Сколько секунд хранить целые страницы лент для анонимов
+PAGE_CACHE_TIMEOUT = 600
+
+# Сколько секунд хранится в кэше список подписок пользователя
+FOLLOW_GRAPH_TIMEOUT = 60 * 60
+
+# Сколько секунд хранится в кэше группа по slug
+GROUP_CACHE_TIMEOUT = 60 * 60
+
+# Сколько первых страниц ленты группы хранится в кэше списком id
+GROUP_FEED_PAGES = 5
+
+# Сколько секунд живёт этот список без обращений к группе
+GROUP_FEED_TIMEOUT = 60 * 60
+
+# Сколько имён можно передать в /api/follow/bulk/ за раз
+FOLLOW_BULK_LIMIT = 100
+
+# Сколько рекомендаций отдаёт /api/follow/suggestions/ (и не больше)
+FOLLOW_SUGGESTIONS_LIMIT = 10
+
+# Сколько секунд прокси может отдавать анонимам закэшированные ленты
+FEED_CACHE_MAX_AGE = 60
+
+# Доля запросов, для которых MetricsMiddleware собирает метрики
+METRICS_SAMPLE_RATE = 0.1
+
+# Сколько последних замеров каждого view хранить для квантилей
+METRICS_BUFFER_SIZE = 1000
+
+# Токен для сборщика метрик: /metrics/ открыт staff и запросам
+# с заголовком «Authorization: Bearer <токен>». По адресу клиента доступ
+# не выдаётся: за обратным прокси все запросы приходят с 127.0.0.1
+METRICS_TOKEN = None
+
+# Запросы к базе дольше порога пишутся в лог со стеком вызова
+SLOW_QUERY_THRESHOLD_MS = 100
+
+# Как часто процесс сбрасывает счётчики запросов в кэш, секунды
+SLOW_QUERY_FLUSH_INTERVAL = 10
+
+# Потоки фоновой генерации миниатюр, 0 — генерировать сразу
+THUMBNAIL_WORKERS = 2
+
+# Ширины вариантов картинок для srcset и форматы по предпочтению.
+# Форматы, которые не умеет кодировать Pillow, пропускаются.
+IMAGE_WIDTHS = (320, 640, 960)
+
+IMAGE_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+
+# Пределы для картинок постов: размер файла в байтах и число пикселей
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+
+IMAGE_UPLOAD_MAX_PIXELS = 25 * 10 ** 6
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -167,3 +279,21 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+if not DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'yatube-l1',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 5,
+                'STAMP_CHECK_INTERVAL': 1,
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        },
+    }